@@ -0,0 +1,481 @@
+'''Flat, array-backed rhyme trie that can be saved to and memory-mapped from
+a versioned binary snapshot'''
+from array import array
+from .IOUtil import map_sections, write_sections
+from .RhymeTrieNode import RhymeTrieNode
+from .rhymeUtils import (Permutations, count_bits, get_consonants,
+                         get_phones_by_id, get_phone_ids, get_phone_mask,
+                         get_vowels, iter_mask_ids, merge_patterns)
+
+MAGIC = b'PHYMTRIE'
+VERSION = 4
+NO_NODE = 0xFFFFFFFF
+NO_PHONE = 0xFF
+
+# (name, array typecode) of each section, in file order
+SECTIONS = (
+    ('child_mask_low', 'Q'),
+    ('child_mask_high', 'Q'),
+    ('edge_start', 'I'),
+    ('edge_child', 'I'),
+    ('node_parent', 'I'),
+    ('node_end', 'I'),
+    ('word_start', 'I'),
+    ('word_offsets', 'I'),
+    ('edge_phone', 'B'),
+    ('node_phone', 'B'),
+    ('node_min_syllables', 'B'),
+    ('node_max_syllables', 'B'),
+    ('word_blob', 'B'),
+    ('phone_blob', 'B'),
+)
+
+
+class FlatRhymeTrie(object):
+    '''A rhyme trie stored as flat arrays:
+
+    child_mask_low, child_mask_high
+                 -- per node, bits of the phone ids of its children, ids
+                    0-63 and 64-127
+    edge_start   -- per node, offset of its first edge (CSR, n_nodes + 1)
+    edge_phone   -- per edge, phone id (edges of a node sorted by phone id)
+    edge_child   -- per edge, index of the child node
+    node_parent  -- per node, index of its parent (NO_NODE for the root)
+    node_phone   -- per node, phone id of its incoming edge
+    node_end     -- per node, index of the first node after its subtree
+    node_min_syllables, node_max_syllables
+                 -- per node, range of the syllables of the words under it
+    word_start   -- per node, id of its first word (CSR, n_nodes + 1)
+    word_offsets -- per word id, offset into word_blob (n_words + 1)
+    word_blob    -- the words, each followed by a newline
+
+    The root is node 0 and phones are numbered as in
+    rhymeUtils.get_phones_by_id(). Nodes and words are both numbered in
+    depth-first order, so the nodes under node i are i to node_end[i] - 1 and
+    their words are word_start[i] to word_start[node_end[i]] - 1. Arrays may
+    be array.array objects or memoryviews over a memory-mapped snapshot
+    file.'''
+
+    def __init__(self, phones, sections, buffer=None):
+        self.phones = tuple(phones)
+        self.phone_ids = {phone: i for i, phone in enumerate(self.phones)}
+        for name, _ in SECTIONS:
+            if name != 'phone_blob':
+                setattr(self, name, sections[name])
+        # child lookups scan a node's few edge phones with bytes.find, which
+        # is much cheaper than bisecting through Python-level indexing
+        self._phone_bytes = {phone: bytes((i,))
+                             for phone, i in self.phone_ids.items()}
+        self._edge_phone_bytes = bytes(self.edge_phone)
+        # keep the mmap alive for as long as the views into it are
+        self._buffer = buffer
+
+    @property
+    def root(self):
+        return FlatRhymeTrieNode(self, 0)
+
+    def __len__(self):
+        return len(self.node_parent)
+
+    def get_word(self, word_id):
+        '''Decode a word id into its string'''
+        start = self.word_offsets[word_id]
+        end = self.word_offsets[word_id + 1] - 1
+        return bytes(self.word_blob[start:end]).decode('utf-8')
+
+    def get_word_slice(self, start, end):
+        '''Decode the words with ids from start to end - 1 in one go.
+        Returns a list of strings'''
+        if start >= end:
+            return []
+        blob = self.word_blob[self.word_offsets[start]:
+                              self.word_offsets[end] - 1]
+        return bytes(blob).decode('utf-8').split('\n')
+
+    def get_sub_word_range(self, index):
+        '''Returns the (start, end) word ids of the words under a node'''
+        word_start = self.word_start
+        return word_start[index], word_start[self.node_end[index]]
+
+    def get_sub_words_of(self, index, syllables):
+        '''Decode the words of a number of syllables under a node, skipping
+        the subtrees without any. Returns a list of strings'''
+        node_end = self.node_end
+        word_start = self.word_start
+        min_syllables = self.node_min_syllables
+        max_syllables = self.node_max_syllables
+        words = []
+        i = index
+        end = node_end[index]
+        while i < end:
+            if not min_syllables[i] <= syllables <= max_syllables[i]:
+                i = node_end[i]
+            elif min_syllables[i] == max_syllables[i]:
+                # every word of the subtree
+                words.extend(self.get_word_slice(word_start[i],
+                                                 word_start[node_end[i]]))
+                i = node_end[i]
+            else:
+                # a node's own words have the fewest syllables of its
+                # subtree
+                if min_syllables[i] == syllables:
+                    words.extend(self.get_word_slice(word_start[i],
+                                                     word_start[i + 1]))
+                i += 1
+        return words
+
+    def get_child_mask(self, index):
+        '''Returns the bits of the phone ids of a node's children as an int'''
+        return (self.child_mask_low[index] |
+                self.child_mask_high[index] << 64)
+
+    def get_child(self, index, phone):
+        '''Find the index of the child of a node along a phone.
+        Returns an int or None'''
+        phone_byte = self._phone_bytes.get(phone)
+        if phone_byte is None:
+            return None
+        i = self._edge_phone_bytes.find(phone_byte, self.edge_start[index],
+                                        self.edge_start[index + 1])
+        if i < 0:
+            return None
+        return self.edge_child[i]
+
+    def save(self, path):
+        '''Write this trie to a binary snapshot file'''
+        sections = {name: getattr(self, name) for name, _ in SECTIONS
+                    if name != 'phone_blob'}
+        sections['phone_blob'] = '\n'.join(self.phones).encode('ascii')
+        write_snapshot(path, sections)
+
+    @classmethod
+    def build(cls, word_phone_dict):
+        '''Build the trie directly from a dict of word -> phones, without
+        creating RhymeTrieNode objects'''
+        return cls._from_entries((phones[::-1], word.lower())
+                                 for word, phones in word_phone_dict.items())
+
+    @classmethod
+    def from_trie(cls, rt):
+        '''Flatten a RhymeTrieNode trie'''
+        def entries():
+            stack = [(rt, ())]
+            while stack:
+                node, phones = stack.pop()
+                for word in node.words:
+                    yield phones, word
+                for phone, child in node.children.items():
+                    stack.append((child, phones + (phone,)))
+        return cls._from_entries(entries())
+
+    @classmethod
+    def _from_entries(cls, entries):
+        '''Build the arrays in one pass over (reversed phones, word) entries
+        sorted by phone ids. Sorting numbers the nodes in depth-first order
+        with children in phone id order, and brings each node's words
+        together right after the node is created, so words numbered in the
+        order they come are in depth-first order too.'''
+        phone_ids = get_phone_ids()
+        if len(phone_ids) > 128:
+            raise ValueError('child masks only fit 128 phones')
+        keyed = sorted(set((tuple(phone_ids[phone] for phone in phones), word)
+                           for phones, word in entries))
+        sections = {name: array(typecode) for name, typecode in SECTIONS}
+        vowel_ids = {phone_ids[phone] for phone in get_vowels()
+                     if phone in phone_ids}
+        node_parent = sections['node_parent']
+        node_phone = sections['node_phone']
+        word_start = sections['word_start']
+        min_syllables = sections['node_min_syllables']
+        max_syllables = sections['node_max_syllables']
+        node_parent.append(NO_NODE)
+        node_phone.append(NO_PHONE)
+        word_start.append(0)
+        min_syllables.append(0)
+        path = [0]
+        # vowels on the path to each node of path
+        path_vowels = [0]
+        previous = ()
+        for word_id, (key, _) in enumerate(keyed):
+            common = 0
+            for phone_id, previous_id in zip(key, previous):
+                if phone_id != previous_id:
+                    break
+                common += 1
+            del path[common + 1:]
+            del path_vowels[common + 1:]
+            for phone_id in key[common:]:
+                node_parent.append(path[-1])
+                node_phone.append(phone_id)
+                word_start.append(word_id)
+                min_syllables.append(0)
+                path.append(len(node_parent) - 1)
+                path_vowels.append(path_vowels[-1] + (phone_id in vowel_ids))
+            min_syllables[path[-1]] = max(path_vowels[-1], 1)
+            previous = key
+        word_start.append(len(keyed))
+        max_syllables.extend(min_syllables)
+
+        # in depth-first order a node's subtree ends where its last child's
+        # does, and children come after their parents. So do the syllable
+        # ranges, where 0 is a node without words of its own
+        node_end = sections['node_end']
+        node_end.extend(range(1, len(node_parent) + 1))
+        for child in range(len(node_parent) - 1, 0, -1):
+            parent = node_parent[child]
+            if node_end[child] > node_end[parent]:
+                node_end[parent] = node_end[child]
+            if (not min_syllables[parent] or
+                    min_syllables[child] < min_syllables[parent]):
+                min_syllables[parent] = min_syllables[child]
+            if max_syllables[child] > max_syllables[parent]:
+                max_syllables[parent] = max_syllables[child]
+
+        # children were created in phone id order, so a stable counting sort
+        # by parent gives each node's edges sorted by phone id
+        edge_start = sections['edge_start']
+        edge_start.extend(0 for _ in range(len(node_parent) + 1))
+        for parent in node_parent[1:]:
+            edge_start[parent + 1] += 1
+        for i in range(len(node_parent)):
+            edge_start[i + 1] += edge_start[i]
+        cursor = array('I', edge_start)
+        edge_child = sections['edge_child']
+        edge_phone = sections['edge_phone']
+        edge_child.extend(0 for _ in range(len(node_parent) - 1))
+        edge_phone.extend(0 for _ in range(len(node_parent) - 1))
+        for child in range(1, len(node_parent)):
+            parent = node_parent[child]
+            edge_child[cursor[parent]] = child
+            edge_phone[cursor[parent]] = node_phone[child]
+            cursor[parent] += 1
+
+        child_mask_low = sections['child_mask_low']
+        child_mask_high = sections['child_mask_high']
+        child_mask_low.extend(0 for _ in range(len(node_parent)))
+        child_mask_high.extend(0 for _ in range(len(node_parent)))
+        for child in range(1, len(node_parent)):
+            phone_id = node_phone[child]
+            if phone_id < 64:
+                child_mask_low[node_parent[child]] |= 1 << phone_id
+            else:
+                child_mask_high[node_parent[child]] |= 1 << (phone_id - 64)
+
+        word_offsets = sections['word_offsets']
+        word_blob = bytearray()
+        for _, word in keyed:
+            word_offsets.append(len(word_blob))
+            word_blob += word.encode('utf-8') + b'\n'
+        word_offsets.append(len(word_blob))
+        sections['word_blob'] = array('B', word_blob)
+        return cls(get_phones_by_id(), sections)
+
+    @classmethod
+    def load(cls, path):
+        '''Memory-map a snapshot file written by save(). The arrays are
+        zero-copy views into the file, so processes that load the same file
+        share its pages.'''
+        sections, buffer = map_sections(path, MAGIC, VERSION, SECTIONS)
+        phones = bytes(sections.pop('phone_blob')).decode('ascii').split('\n')
+        return cls(phones, sections, buffer)
+
+
+def write_snapshot(path, sections):
+    '''Write the named arrays of a trie to a snapshot file'''
+    write_sections(path, MAGIC, VERSION, SECTIONS, sections)
+
+
+class FlatRhymeTrieNode(RhymeTrieNode):
+    '''A lightweight view of one node of a FlatRhymeTrie, with the same
+    interface as RhymeTrieNode'''
+    __slots__ = ('trie', 'index')
+
+    def __init__(self, trie, index):
+        self.trie = trie
+        self.index = index
+
+    def __eq__(self, other):
+        return (isinstance(other, FlatRhymeTrieNode) and
+                other.trie is self.trie and other.index == self.index)
+
+    def __hash__(self):
+        return hash(self.index)
+
+    @property
+    def phone(self):
+        phone_id = self.trie.node_phone[self.index]
+        return None if phone_id == NO_PHONE else self.trie.phones[phone_id]
+
+    @property
+    def parent(self):
+        parent = self.trie.node_parent[self.index]
+        return None if parent == NO_NODE else FlatRhymeTrieNode(self.trie,
+                                                                parent)
+
+    @property
+    def children(self):
+        trie = self.trie
+        edges = range(trie.edge_start[self.index],
+                      trie.edge_start[self.index + 1])
+        return {trie.phones[trie.edge_phone[i]]:
+                FlatRhymeTrieNode(trie, trie.edge_child[i]) for i in edges}
+
+    @property
+    def child_mask(self):
+        return self.trie.get_child_mask(self.index)
+
+    @property
+    def min_syllables(self):
+        return self.trie.node_min_syllables[self.index]
+
+    @property
+    def max_syllables(self):
+        return self.trie.node_max_syllables[self.index]
+
+    @property
+    def words(self):
+        trie = self.trie
+        return set(trie.get_word_slice(trie.word_start[self.index],
+                                       trie.word_start[self.index + 1]))
+
+    def insert(self, phones, word):
+        raise TypeError('FlatRhymeTrie is read-only')
+
+    def get_child(self, phone):
+        index = self.trie.get_child(self.index, phone)
+        return None if index is None else FlatRhymeTrieNode(self.trie, index)
+
+    def search(self, phones):
+        trie = self.trie
+        index = self.index
+        for phone in phones:
+            index = trie.get_child(index, phone)
+            if index is None:
+                return None
+        return FlatRhymeTrieNode(trie, index)
+
+    def get_masked_children(self, mask):
+        trie = self.trie
+        child_mask = trie.get_child_mask(self.index)
+        first = trie.edge_start[self.index]
+        for phone_id in iter_mask_ids(child_mask & mask):
+            edge = first + count_bits(child_mask & ((1 << phone_id) - 1))
+            yield FlatRhymeTrieNode(trie, trie.edge_child[edge])
+
+    def search_permutations(self, phones, stats=None, budget=None,
+                            syllables=None):
+        return self.search_patterns(merge_patterns([phones]), stats, budget,
+                                    syllables)
+
+    def search_patterns(self, pattern_trie, stats=None, budget=None,
+                        syllables=None):
+        trie = self.trie
+        return (FlatRhymeTrieNode(trie, index) for index in
+                self._search_pattern_indices(pattern_trie, stats, budget,
+                                             syllables))
+
+    def search_permutation_roots(self, phones, stats=None, budget=None,
+                                 syllables=None):
+        return self.search_pattern_roots(merge_patterns([phones]), stats,
+                                         budget, syllables)
+
+    def search_pattern_roots(self, pattern_trie, stats=None, budget=None,
+                             syllables=None):
+        # subtrees are ranges of node indices: in index order, a match is a
+        # root unless it falls in the range of the last root
+        trie = self.trie
+        node_end = trie.node_end
+        roots = []
+        end = 0
+        indices = sorted(self._search_pattern_indices(pattern_trie, stats,
+                                                      budget, syllables))
+        for index in indices:
+            if index >= end:
+                roots.append(FlatRhymeTrieNode(trie, index))
+                end = node_end[index]
+        if stats is not None:
+            stats.count('matches', len(indices))
+            stats.count('roots', len(roots))
+        return roots
+
+    def _search_pattern_indices(self, pattern_trie, stats=None, budget=None,
+                                syllables=None):
+        '''RhymeTrieNode.search_patterns over node indices and phone ids, so
+        visited states hash as plain ints'''
+        trie = self.trie
+        edge_start = trie.edge_start
+        edge_child = trie.edge_child
+        min_syllables = trie.node_min_syllables
+        max_syllables = trie.node_max_syllables
+        child_mask_low = trie.child_mask_low
+        child_mask_high = trie.child_mask_high
+        steps, accepting = pattern_trie
+        additive = [bool(position_steps) and
+                    position_steps[0][1] is Permutations.ADDITIVE
+                    for position_steps in steps]
+        consonants = get_phone_mask(get_consonants())
+        stack = [(self.index, 0)]
+        seen = set(stack)
+        while stack:
+            if budget is not None and budget.visit(len(seen)):
+                break
+            index, position = stack.pop()
+            if accepting[position]:
+                yield index
+                continue
+            # edges are sorted by phone id, so the edge of a child is the
+            # number of children with lower phone ids past the first edge
+            mask = child_mask_low[index] | child_mask_high[index] << 64
+            first = edge_start[index]
+            for candidates, permutation, next_position in steps[position]:
+                if permutation is Permutations.SUBTRACTIVE:
+                    state = (index, next_position)
+                    if state not in seen:
+                        seen.add(state)
+                        stack.append(state)
+                hits = mask & candidates
+                while hits:
+                    bit = hits & -hits
+                    hits ^= bit
+                    child = edge_child[first + count_bits(mask & (bit - 1))]
+                    if syllables is not None and not (
+                            min_syllables[child] <= syllables <=
+                            max_syllables[child]):
+                        continue
+                    state = (child, next_position)
+                    if state not in seen:
+                        seen.add(state)
+                        stack.append(state)
+            if additive[position]:
+                hits = mask & consonants
+                while hits:
+                    bit = hits & -hits
+                    hits ^= bit
+                    child = edge_child[first + count_bits(mask & (bit - 1))]
+                    if syllables is not None and not (
+                            min_syllables[child] <= syllables <=
+                            max_syllables[child]):
+                        continue
+                    state = (child, position)
+                    if state not in seen:
+                        seen.add(state)
+                        stack.append(state)
+        if stats is not None:
+            stats.count('states', len(seen))
+            stats.count('nodes', len({index for index, _ in seen}))
+
+    def get_sub_words(self, syllables=None):
+        trie = self.trie
+        if syllables is not None:
+            return trie.get_sub_words_of(self.index, syllables)
+        return trie.get_word_slice(*trie.get_sub_word_range(self.index))
+
+    def count_sub_words(self):
+        start, end = self.trie.get_sub_word_range(self.index)
+        return end - start
+
+    def count_nodes(self):
+        return self.trie.node_end[self.index] - self.index
+
+    def count_words(self):
+        return self.count_sub_words()
@@ -0,0 +1,134 @@
+'''Scored fuzzy rhymes: a best-first search of the rhyme trie that prices
+each edit of a word's rhyming tail, instead of matching fixed rhyme types'''
+import heapq
+from collections import namedtuple
+from itertools import count
+from .rhymeUtils import (get_consonants, get_vowels, get_phone_ids,
+                         get_phone_mask, get_consonant_family,
+                         get_consonant_partners, is_vowel)
+
+# cost of each edit of a rhyming tail, or None to forbid it:
+#   stress    -- a vowel with another stress (AO1 -> AO0)
+#   vowel     -- another vowel (AO1 -> AE1)
+#   family    -- a consonant of the same type and voicing (G -> D)
+#   partner   -- a consonant of the same type (G -> K)
+#   consonant -- any other consonant (G -> S)
+#   insertion -- an added consonant (DOG -> DOGS)
+#   deletion  -- a dropped consonant (DOGS -> DOG)
+EditCosts = namedtuple('EditCosts', ['stress', 'vowel', 'family', 'partner',
+                                     'consonant', 'insertion', 'deletion'])
+DEFAULT_COSTS = EditCosts(stress=0.5, vowel=3.0, family=1.0, partner=1.5,
+                          consonant=2.0, insertion=1.0, deletion=1.0)
+
+
+def _strip_stress(phone):
+    return phone.rstrip('012')
+
+
+class FuzzyRhymer(object):
+    '''Finds the words whose pronunciations end in a rhyming tail up to
+    priced edits, cheapest first. Works on the root of either rhyme trie
+    engine.'''
+
+    def __init__(self, costs=DEFAULT_COSTS):
+        self.costs = costs
+        # phone -> ((cost, mask of replacements at that cost), ...)
+        self._tiers = {}
+
+    def get_tiers(self, phone):
+        '''Returns ((cost, phone mask), ...) of the phones that may stand
+        for a phone of the tail, itself included at cost 0'''
+        tiers = self._tiers.get(phone)
+        if tiers is not None:
+            return tiers
+        costs = self.costs
+        if is_vowel(phone):
+            base = _strip_stress(phone)
+            vowels = get_vowels()
+            stressed = {vowel for vowel in vowels
+                        if _strip_stress(vowel) == base}
+            classes = ((costs.stress, stressed),
+                       (costs.vowel, vowels))
+        else:
+            family = set(get_consonant_family(phone))
+            classes = ((costs.family, family),
+                       (costs.partner, family | set(get_consonant_partners(
+                           phone))),
+                       (costs.consonant, get_consonants()))
+        phone_ids = get_phone_ids()
+        taken = {phone}
+        tiers = [(0, get_phone_mask((phone,)))]
+        for cost, phones in classes:
+            phones = {other for other in phones
+                      if other not in taken and other in phone_ids}
+            taken |= phones
+            if cost is not None and phones:
+                tiers.append((cost, get_phone_mask(phones)))
+        tiers = self._tiers[phone] = tuple(tiers)
+        return tiers
+
+    def search(self, root, phones, max_cost, budget=None):
+        '''Best-first search for the nodes under which every word ends in
+        phones up to edits costing at most max_cost.
+
+        Arguments:
+            root {RhymeTrieNode} -- root of a rhyme trie
+            phones {list} -- the rhyming tail, in pronunciation order
+            max_cost {float} -- most total edit cost to accept
+
+        Keyword Arguments:
+            budget {QueryBudget | None} -- if set, stops early when it runs
+                out (default: {None})
+
+        Returns:
+            [generator] -- (cost, node) tuples, cheapest first. Nodes under
+                one already generated are left out, but a later node may be
+                above an earlier one, so words can come again at a higher
+                cost
+        '''
+        target = list(reversed(phones))
+        end = len(target)
+        tiers = [self.get_tiers(phone) for phone in target]
+        deletable = [self.costs.deletion is not None and not is_vowel(phone)
+                     for phone in target]
+        insertion = self.costs.insertion
+        consonants = get_phone_mask(get_consonants())
+        # a counter breaks cost ties, so nodes never get compared
+        order = count()
+        heap = [(0, next(order), root, 0)]
+        best = {(root, 0): 0}
+        found = set()
+        while heap:
+            if budget is not None and budget.visit(len(best)):
+                return
+            cost, _, node, i = heapq.heappop(heap)
+            if best.get((node, i), cost) < cost:
+                continue
+            if i == end:
+                ancestor = node
+                while ancestor is not None and ancestor not in found:
+                    ancestor = ancestor.parent
+                if ancestor is None:
+                    found.add(node)
+                    yield cost, node
+                continue
+            steps = []
+            if deletable[i]:
+                steps.append((self.costs.deletion, (node,), i + 1))
+            for edit_cost, mask in tiers[i]:
+                steps.append((edit_cost, node.get_masked_children(mask),
+                              i + 1))
+            if insertion is not None:
+                steps.append((insertion,
+                              node.get_masked_children(consonants), i))
+            for edit_cost, nodes, position in steps:
+                next_cost = cost + edit_cost
+                if next_cost > max_cost:
+                    continue
+                for next_node in nodes:
+                    state = (next_node, position)
+                    if best.get(state, next_cost + 1) <= next_cost:
+                        continue
+                    best[state] = next_cost
+                    heapq.heappush(heap, (next_cost, next(order), next_node,
+                                          position))
@@ -1,34 +1,150 @@
-'''Utils for loading and parsing pronunciation data into data structures'''
+'''Utils for loading and parsing pronunciation data into data structures.
+Every dataset is loaded lazily, on the first call to its loader, and cached
+for the life of the process.'''
 import json
-import pickle
+import mmap
 import os
-from collections import defaultdict
+import struct
+import sys
+import tempfile
+from array import array
+from .util import load_once
 
 file_path = os.path.dirname(__file__)
 
-# use global objects so we don't load data each time we call a method
-word_phone_dict = {}
-phone_type_dict = {}
-type_phone_dict = {}
-type_voiced_phone_dict = defaultdict(lambda: defaultdict(set))
-_rt = None
 
+def _load_json(name):
+    with open(os.path.join(file_path, 'data', name)) as f:
+        return json.load(f)
 
+
+@load_once
 def load_word_phone_dict():
     '''Load a dict of word -> phones mappings'''
-    if word_phone_dict:
-        return word_phone_dict
-    with open(os.path.join(file_path, 'data/word_phone.json')) as f:
-        word_phone_dict.update(json.load(f))
-    return word_phone_dict
+    return _load_json('word_phone.json')
 
 
+@load_once
 def load_phone_type_dicts():
     '''Load both phone -> type and type -> phone mapped dicts'''
-    if phone_type_dict and type_phone_dict:
-        return phone_type_dict, type_phone_dict
-    with open(os.path.join(file_path, 'data/phone_type.json')) as f:
-        phone_type_dict.update(json.load(f))
-    with open(os.path.join(file_path, 'data/type_phone.json')) as f:
-        type_phone_dict.update(json.load(f))
-    return phone_type_dict, type_phone_dict
+    return _load_json('phone_type.json'), _load_json('type_phone.json')
+
+
+@load_once
+def load_word_keys():
+    '''Load a dict of word -> short key mappings used by the song stats'''
+    return _load_json('word_keys.json')
+
+
+@load_once
+def load_keyed_counts():
+    '''Load a dict of word key -> frequency rank'''
+    return _load_json('keyed_counts.json')
+
+
+@load_once
+def load_keyed_pairs():
+    '''Load a dict of word key -> keys of the words it is most often
+    rhymed with'''
+    return _load_json('keyed_pairs.json')
+
+
+def load_word_info_records():
+    '''Load the prebuilt word info table written by make_files.py, as a list
+    of [syllables, stresses, last_stressed, [words]] records, or None if it
+    has not been built'''
+    if not os.path.exists(os.path.join(file_path, 'data', 'word_info.json')):
+        return None
+    return _load_json('word_info.json')
+
+
+def load_word_variant_records():
+    '''Load the prebuilt table of the pronunciations of words with more than
+    one, written by make_files.py, as a dict of word -> [pronunciation keys],
+    or None if it has not been built'''
+    if not os.path.exists(os.path.join(file_path, 'data',
+                                       'word_variants.json')):
+        return None
+    return _load_json('word_variants.json')
+
+
+# binary files: a header of magic, version and byte order, a table of
+# (offset, length) of each section, then the sections
+_HEADER = struct.Struct('<8sIc3x')
+_SECTION = struct.Struct('<QQ')
+_ALIGN = 8
+
+
+def write_sections(path, magic, version, layout, sections):
+    '''Write named arrays to a binary file that map_sections can memory-map,
+    each aligned to 8 bytes.
+
+    Arguments:
+        path {str} -- file to write
+        magic {bytes} -- 8 bytes identifying the kind of file
+        version {int} -- format version
+        layout {sequence} -- (name, array typecode) of each section, in order
+        sections {dict} -- name -> array, or bytes for 'B' sections
+    '''
+    position = _HEADER.size + _SECTION.size * len(layout)
+    table = []
+    for name, typecode in layout:
+        position += -position % _ALIGN
+        data = sections[name]
+        if not isinstance(data, (bytes, bytearray)):
+            data = memoryview(data).cast('B')
+        table.append((position, data))
+        position += len(data)
+    # write a new file and move it over path, so processes that have the
+    # old one memory-mapped keep reading it intact
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)),
+        prefix=os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(magic, version,
+                                 sys.byteorder[:1].encode('ascii')))
+            for (name, typecode), (offset, data) in zip(layout, table):
+                f.write(_SECTION.pack(offset,
+                                      len(data) // array(typecode).itemsize))
+            for offset, data in table:
+                f.write(b'\0' * (offset - f.tell()))
+                f.write(data)
+        # mkstemp files are private to their owner
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def map_sections(path, magic, version, layout):
+    '''Memory-map a file written by write_sections.
+    Returns a dict of name -> memoryview of each section, cast to its
+    typecode, and the mmap, which must outlive the views.
+    Raises ValueError if the file has another magic, version or byte order,
+    or a section that is misaligned or runs past the end of the file'''
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(buffer)
+    found_magic, found_version, byteorder = _HEADER.unpack_from(view)
+    if found_magic != magic:
+        raise ValueError('{} is not a {} file'.format(
+            path, magic.decode('ascii')))
+    if found_version != version:
+        raise ValueError('{} has version {}, expected {}'.format(
+            path, found_version, version))
+    if byteorder != sys.byteorder[:1].encode('ascii'):
+        raise ValueError('{} was written with a different byte order'
+                         .format(path))
+    sections = {}
+    position = _HEADER.size
+    for name, typecode in layout:
+        offset, length = _SECTION.unpack_from(view, position)
+        position += _SECTION.size
+        size = array(typecode).itemsize
+        if offset % size or offset + length * size > len(view):
+            raise ValueError('{} is truncated or corrupt: section {} does '
+                             'not fit'.format(path, name))
+        sections[name] = view[offset:offset + length * size].cast(typecode)
+    return sections, buffer
@@ -0,0 +1,135 @@
+'''Phrase rhymes: rhymes of several words, found by going on with a rhyme
+trie search from the root when a word ends before the rhyme pattern does'''
+from .rhymeUtils import strip_pronunciation_marker
+
+
+def _canonical(word):
+    return strip_pronunciation_marker(word) if '(' in word else word
+
+
+def _best_distinct(candidates, limit):
+    '''Returns the limit smallest (key, words) candidates, each words tuple
+    once'''
+    best = []
+    seen = set()
+    for key, words in sorted(candidates):
+        if words not in seen:
+            seen.add(words)
+            best.append((key, words))
+            if limit is not None and len(best) >= limit:
+                break
+    return best
+
+
+class PhraseRhymer(object):
+    '''Finds phrases of several words whose pronunciations, run together,
+    match a rhyme pattern. The trie holds single words, so wherever a search
+    reaches a node holding complete words with pattern phones left to match,
+    the phrase can go on with another word before them, matched from the
+    root at the same pattern position. What can come before a word depends
+    only on that position and the number of words left, so each (position,
+    words left) state is searched once per query, whatever the words after
+    it. Works on the root of either rhyme trie engine.'''
+
+    def __init__(self, root, score):
+        '''
+        Arguments:
+            root {RhymeTrieNode} -- root of a rhyme trie
+            score {callable} -- word -> number, lower for better words, or
+                None to keep a word out of phrases
+        '''
+        self.root = root
+        self.score = score
+
+    def score_words(self, words):
+        '''Returns a dict of canonical word -> score of the words that have
+        one'''
+        scored = {}
+        for word in words:
+            word = _canonical(word)
+            if word not in scored:
+                scored[word] = self.score(word)
+        return {word: score for word, score in scored.items()
+                if score is not None}
+
+    def search(self, pattern_trie, max_words=2, limit=50, budget=None):
+        '''Search for the best phrases matching the patterns of a
+        rhymeUtils.PatternTrie.
+
+        Arguments:
+            pattern_trie {PatternTrie} -- merged reversed rhyme patterns
+
+        Keyword Arguments:
+            max_words {int} -- most words in a phrase (default: {2})
+            limit {int | None} -- most phrases to return (default: {50})
+            budget {QueryBudget | None} -- if set, each search from the root
+                stops early when it runs out (default: {None})
+
+        Returns:
+            [list] -- ((number of words, total score), words) tuples of the
+                phrases of 2 to max_words words, best first, with the words
+                of each in phrase order. Single words are left out: they
+                are the plain rhymes of the pattern
+        '''
+        accepting = pattern_trie.accepting
+        walks = {}
+        first_words = {}
+        phrases = {}
+
+        def walk(position):
+            '''Returns (matching nodes, [(pattern position, scored words)])
+            of a search from the root at a pattern position: the nodes where
+            the pattern is complete, and the words that end with pattern
+            phones left, with the position to go on from'''
+            found = walks.get(position)
+            if found is None:
+                ends = []
+                crossings = []
+                for node, next_position in self.root.walk_patterns(
+                        pattern_trie, position, budget=budget):
+                    if accepting[next_position]:
+                        ends.append(node)
+                        continue
+                    words = node.words
+                    if words:
+                        scored = self.score_words(words)
+                        if scored:
+                            crossings.append((next_position, scored))
+                found = walks[position] = (ends, crossings)
+            return found
+
+        def get_first_words(position):
+            '''Returns the scored words that complete the pattern from a
+            position, the first words of phrases'''
+            found = first_words.get(position)
+            if found is None:
+                found = {}
+                for node in walk(position)[0]:
+                    if budget is not None and budget.check():
+                        break
+                    found.update(self.score_words(node.get_sub_words()))
+                first_words[position] = found
+            return found
+
+        def get_phrases(position, words_left, single=True):
+            '''Returns the best phrases of up to words_left words that
+            complete the pattern from a position, by (words, score)'''
+            key = (position, words_left, single)
+            found = phrases.get(key)
+            if found is None:
+                candidates = []
+                if single:
+                    candidates.extend(
+                        ((1, score), (word,))
+                        for word, score in get_first_words(position).items())
+                if words_left > 1:
+                    for next_position, scored in walk(position)[1]:
+                        before = get_phrases(next_position, words_left - 1)
+                        candidates.extend(
+                            ((n + 1, total + score), words + (word,))
+                            for (n, total), words in before
+                            for word, score in scored.items())
+                found = phrases[key] = _best_distinct(candidates, limit)
+            return found
+
+        return get_phrases(0, max_words, single=False)
@@ -1,52 +1,574 @@
+import heapq
+import multiprocessing
+from array import array
+import os
+import struct
+import warnings
 from . import rhymeUtils as ru
-from .util import flatten
-from .IOUtil import load_word_phone_dict, load_phone_type_dicts
-from .rhymeUtils import PermutedPhone, Permutations
+from .util import flatten, load_once
+from .IOUtil import load_word_phone_dict, file_path
 from .RhymeTrieNode import RhymeTrieNode
-from .songStats import sort_words
-from itertools import groupby
-
-_rt = None
+from .FlatRhymeTrie import FlatRhymeTrie
+from .RhymeIndex import RhymeIndex
+from .RhymeTable import RhymeTable
+from .RhymeCache import RhymeCache, cached_rhymes
+from .QueryStats import QueryStats
+from .FuzzyRhymer import FuzzyRhymer
+from .PhraseRhymer import PhraseRhymer
+from .songStats import (sort_words, iter_ranked_words, is_ranked,
+                        get_paired_words, load_song_ranking)
+from .SongRanking import unranked_key
+from collections import defaultdict
+
+_rt = {}
+# iter_rhymes sorts at least this many matches before switching to testing
+# ranked words against the matched nodes
+TOP_K_THRESHOLD = 2048
+SNAPSHOT_PATH = os.path.join(file_path, 'data/rhyme_trie.bin')
+RHYME_INDEX_PATH = os.path.join(file_path, 'data/rhyme_index.bin')
+RHYME_TABLE_PATH = os.path.join(file_path, 'data/rhyme_table.bin')
 
 
 class Phyme(object):
     '''Phyme: a rhyming dictionary for songwriting'''
 
-    def __init__(self):
-        self.rhyme_trie = load_rhyme_trie()
+    def __init__(self, engine='flat', cache_size=None, stats_hook=None,
+                 use_index=True, use_table=True):
+        '''
+        Keyword Arguments:
+            engine {str} -- rhyme trie engine, 'flat' or 'node'
+                (default: {'flat'})
+            cache_size {int | None} -- if set, keep the results of up to this
+                many get_*_rhymes queries in an LRU cache. Cached results are
+                read-only mappings of syllables -> tuples of words
+                (default: {None})
+            stats_hook {callable | None} -- if set, called with the
+                QueryStats of every get_*_rhymes query not served from the
+                cache (default: {None})
+            use_index {bool} -- answer assonance and consonant rhyme queries
+                from the RhymeIndex instead of the trie (default: {True})
+            use_table {bool} -- answer get_*_rhymes queries with the default
+                num_syllables and no budget from the RhymeTable written by
+                make_files.py, if there is one and it has the word. Like
+                cached ones, these queries do not call stats_hook
+                (default: {True})
+        '''
+        self.engine = engine
+        self.rhyme_trie = load_rhyme_trie(engine)
+        self.cache = RhymeCache(cache_size) if cache_size else None
+        self.stats_hook = stats_hook
+        self.use_index = use_index
+        self.use_table = use_table
+        # loaded on the first lookup
+        self.rhyme_table = None
+        self.fuzzy_rhymer = FuzzyRhymer()
+
+    def cache_stats(self):
+        '''Returns the CacheStats of the result cache, or None if caching is
+        off'''
+        return self.cache.stats() if self.cache is not None else None
 
     def search(self, phones):
         '''Search the rhyme trie for sub words given a listen of phones
         Returns a set of strings'''
         result = self.rhyme_trie.search(phones[::-1])
         if result:
-            sorted_results = sorted(result.get_sub_words(),
-                                    key=ru.count_syllables)
-            grouped_results = groupby(sorted_results, key=ru.count_syllables)
-            return dict((k, list(v)) for k, v in grouped_results)
+            return group_by_syllables(result.get_sub_words())
         else:
             return None
 
-    def search_permutations(self, phones):
+    def search_index(self, phones):
+        '''Look up the words matching a pattern in the RhymeIndex.
+        Returns a list of words, or None if the pattern is not indexed or
+        the index is off'''
+        if not self.use_index:
+            return None
+        return load_rhyme_index().search(phones)
+
+    def search_table(self, word, rhyme_type, word_filter=None):
+        '''Look up the rhymes of a word in the RhymeTable.
+        Returns a dict of syllables -> sorted list of rhymes, or None if the
+        table is off or missing or does not have the word'''
+        if not self.use_table:
+            return None
+        if self.rhyme_table is None:
+            self.rhyme_table = load_rhyme_table()
+            if self.rhyme_table is None:
+                return None
+        groups = self.rhyme_table.get_groups(word, rhyme_type)
+        if groups is None:
+            return None
+        ranking = load_song_ranking()
+        pair_ranks = ranking.get_pair_ranks(word)
+        result = {}
+        for syllables, words in groups:
+            if word_filter is not None:
+                if syllables != word_filter.syllables:
+                    continue
+                if word_filter.stresses is not None:
+                    words = ru.filter_words(words, word_filter)
+                    if not words:
+                        continue
+            result[syllables] = ranking.resort(words, pair_ranks)
+        return result
+
+    def search_permutations(self, phones, budget=None, word_filter=None):
         phones = list(phones)
-        nodes = self.rhyme_trie.search_permutations(phones[::-1])
-        result_set = set()
-        for node in nodes:
-            result = node.get_sub_words()
-            result_set.update(result)
-        sorted_results = sorted(result_set,
-                                key=ru.count_syllables)
-        grouped_results = groupby(sorted_results, key=ru.count_syllables)
-        return dict((k, list(v)) for k, v in grouped_results)
-
-    def sorted_search(self, phones, keyword):
-        results = self.search_permutations(phones)
+        words = self.search_index(phones)
+        if words is not None:
+            if word_filter is not None:
+                words = ru.filter_words(words, word_filter)
+            if budget is not None:
+                words = budget.collect([words])
+            return group_by_syllables(words)
+        syllables = word_filter.syllables if word_filter is not None else None
+        nodes = self.rhyme_trie.search_permutation_roots(
+            phones[::-1], budget=budget, syllables=syllables)
+        # the subtrees of the roots are disjoint, so no word comes twice
+        sub_words = (node.get_sub_words(syllables) for node in nodes)
+        if word_filter is not None and word_filter.stresses is not None:
+            sub_words = (ru.filter_words(words, word_filter)
+                         for words in sub_words)
+        if budget is not None:
+            return group_by_syllables(budget.collect(sub_words))
+        return group_by_syllables(flatten(sub_words))
+
+    def search_variant_patterns(self, patterns):
+        '''Search for the words matching any of several patterns at once.
+        The patterns are merged, so their common tails are searched once,
+        and their matches are collected with nested ones dropped, so no word
+        comes twice. Returns a list of words'''
+        patterns = list(patterns)
+        if len(patterns) == 1:
+            words = self.search_index(patterns[0])
+            if words is not None:
+                return words
+        pattern_trie = ru.merge_patterns(pattern[::-1] for pattern in patterns)
+        words = []
+        for node in self.rhyme_trie.search_pattern_roots(pattern_trie):
+            words.extend(node.get_sub_words())
+        return words
+
+    def sorted_search(self, phones, keyword, budget=None, word_filter=None):
+        results = self.search_permutations(phones, budget, word_filter)
         sorted_dict = dict()
         for k, v in results.items():
             sorted_dict[k] = list(sort_words(keyword, v))
         return sorted_dict
 
-    def get_perfect_rhymes(self, word, num_syllables=None):
+    def _search_rhymes(self, word, rhyme_type, num_syllables, budget=None,
+                       syllables=None, stresses=None):
+        if num_syllables is None and budget is None:
+            result = self.search_table(word, rhyme_type, ru.make_word_filter(
+                syllables, stresses))
+            if result is not None:
+                return result
+        if self.stats_hook is not None:
+            result, stats = self.get_rhymes_with_stats(
+                word, rhyme_type, num_syllables, budget, syllables, stresses)
+            self.stats_hook(stats)
+            return result
+        word_filter = ru.make_word_filter(syllables, stresses)
+        pattern = ru.get_rhyme_pattern(word, rhyme_type, num_syllables)
+        if pattern is None:
+            return dict()
+        return self.sorted_search(pattern, word, budget, word_filter)
+
+    def get_rhymes(self, word, rhyme_type, num_syllables=None, budget=None,
+                   syllables=None, stresses=None):
+        '''Get rhymes of a word by rhyme type name, one of
+        rhymeUtils.RHYME_TYPES ('perfect', 'family', ...)'''
+        if rhyme_type not in ru.RHYME_TYPES:
+            raise ValueError('Unknown rhyme type: {}'.format(rhyme_type))
+        method = getattr(self, 'get_{}_rhymes'.format(rhyme_type))
+        return method(word, num_syllables, budget, syllables, stresses)
+
+    def get_variant_rhymes(self, word, rhyme_type, num_syllables=None):
+        '''Get rhymes of every pronunciation of a word (READ and READ(1)),
+        in one search. Rhymes are returned under their canonical spelling,
+        each once, grouped by the syllables of that spelling's first
+        pronunciation
+
+        Arguments:
+            word {str} -- word to rhyme, or any of its pronunciation keys
+            rhyme_type {str} -- one of rhymeUtils.RHYME_TYPES
+
+        Keyword Arguments:
+            num_syllables {int | None} -- as for the get_*_rhymes methods
+                (default: {None})
+
+        Returns:
+            [dict] -- syllables -> sorted list of rhymes
+        '''
+        if rhyme_type not in ru.RHYME_TYPES:
+            raise ValueError('Unknown rhyme type: {}'.format(rhyme_type))
+        patterns = []
+        for variant in ru.get_word_variants(word):
+            pattern = ru.get_rhyme_pattern(variant, rhyme_type, num_syllables)
+            if pattern is not None and pattern not in patterns:
+                patterns.append(pattern)
+        if not patterns:
+            return dict()
+        word_info = ru.load_word_info()
+        groups = defaultdict(list)
+        seen = set()
+        for variant in self.search_variant_patterns(patterns):
+            canonical = (ru.strip_pronunciation_marker(variant)
+                         if '(' in variant else variant)
+            if canonical in seen:
+                continue
+            seen.add(canonical)
+            info = word_info.get(canonical) or word_info[variant]
+            groups[info.syllables].append(canonical)
+        canonical = ru.strip_pronunciation_marker(word.lower())
+        return {k: sort_words(canonical, v) for k, v in sorted(groups.items())}
+
+    def get_fuzzy_rhymes(self, word, num_syllables=None, limit=20,
+                         max_cost=3.0, costs=None, budget=None):
+        '''Get the best near rhymes of a word, scored by the cost of the
+        edits that turn its rhyming tail into theirs (see
+        FuzzyRhymer.EditCosts). The trie is searched cheapest first, so only
+        words within max_cost are ever reached. The word itself is left out
+
+        Arguments:
+            word {str} -- word to rhyme
+
+        Keyword Arguments:
+            num_syllables {int | None} -- as for the get_*_rhymes methods
+                (default: {None})
+            limit {int | None} -- maximum number of rhymes (default: {20})
+            max_cost {float} -- most total edit cost to accept
+                (default: {3.0})
+            costs {EditCosts | None} -- edit costs (default: {None}, for
+                FuzzyRhymer.DEFAULT_COSTS)
+            budget {QueryBudget | None} -- as for the get_*_rhymes methods
+                (default: {None})
+
+        Returns:
+            [list] -- (word, cost) tuples, cheapest first, and in
+                sort_words order at equal cost
+        '''
+        phones = list(flatten(ru.get_last_syllables(word, num_syllables)))
+        rhymer = self.fuzzy_rhymer if costs is None else FuzzyRhymer(costs)
+        canonical = ru.strip_pronunciation_marker(word.lower())
+        seen = {canonical}
+        results = []
+        level = None
+        level_words = []
+        for cost, node in rhymer.search(self.rhyme_trie, phones, max_cost,
+                                        budget):
+            if cost != level:
+                # a cost level is complete once a higher cost comes
+                results.extend((rhyme, level) for rhyme in
+                               sort_words(canonical, level_words))
+                if limit is not None and len(results) >= limit:
+                    return results[:limit]
+                level = cost
+                level_words = []
+            for sub_word in node.get_sub_words():
+                if '(' in sub_word:
+                    sub_word = ru.strip_pronunciation_marker(sub_word)
+                if sub_word not in seen:
+                    seen.add(sub_word)
+                    level_words.append(sub_word)
+        results.extend((rhyme, level) for rhyme in
+                       sort_words(canonical, level_words))
+        return results[:limit]
+
+    def get_phrase_rhymes(self, word, rhyme_type='perfect', num_syllables=None,
+                          max_words=2, limit=50, max_rank=None, budget=None):
+        '''Get rhymes of a word made of several words, like 'door hinge' for
+        'orange'. Phrases are ranked by their number of words, then by the
+        sum of the song frequency ranks of their words
+
+        Arguments:
+            word {str} -- word to rhyme
+
+        Keyword Arguments:
+            rhyme_type {str} -- one of rhymeUtils.RHYME_TYPES
+                (default: {'perfect'})
+            num_syllables {int | None} -- as for the get_*_rhymes methods
+                (default: {None})
+            max_words {int} -- most words in a phrase (default: {2})
+            limit {int | None} -- maximum number of phrases (default: {50})
+            max_rank {int | None} -- if set, leave out words with a lower
+                song frequency than this rank, or with none. Fewer words
+                make for a faster search (default: {None})
+            budget {QueryBudget | None} -- as for the get_*_rhymes methods
+                (default: {None})
+
+        Returns:
+            [list] -- phrases, best first
+        '''
+        if rhyme_type not in ru.RHYME_TYPES:
+            raise ValueError('Unknown rhyme type: {}'.format(rhyme_type))
+        pattern = ru.get_rhyme_pattern(word, rhyme_type, num_syllables)
+        if pattern is None:
+            return []
+        ranking = load_song_ranking()
+        # unranked words score worse than any ranked one
+        unranked = len(ranking)
+
+        def score(other):
+            rank = ranking.get_count_rank(other)
+            if rank is None:
+                rank = unranked
+            if max_rank is not None and rank > max_rank:
+                return None
+            return rank
+
+        rhymer = PhraseRhymer(self.rhyme_trie, score)
+        phrases = rhymer.search(ru.merge_patterns([pattern[::-1]]),
+                                max_words, limit, budget)
+        return [' '.join(words) for _, words in phrases]
+
+    def rhymes_with(self, word, other, rhyme_type, num_syllables=None):
+        '''Tests if other is among the rhymes of word of a rhyme type, by
+        matching the rhyme pattern of word against the pronunciation of
+        other instead of searching the trie
+
+        Arguments:
+            word {str} -- word to rhyme
+            other {str} -- candidate rhyme
+            rhyme_type {str} -- one of rhymeUtils.RHYME_TYPES
+
+        Keyword Arguments:
+            num_syllables {int | None} -- as for the get_*_rhymes methods
+                (default: {None})
+
+        Returns:
+            [bool] -- False if other is not in the dictionary
+        '''
+        if rhyme_type not in ru.RHYME_TYPES:
+            raise ValueError('Unknown rhyme type: {}'.format(rhyme_type))
+        pattern = ru.get_rhyme_pattern(word, rhyme_type, num_syllables)
+        phones = ru.get_word_phones(other)
+        if pattern is None or phones is None:
+            return False
+        return ru.matches_rhyme_pattern(pattern, phones)
+
+    def get_rhymes_with_stats(self, word, rhyme_type, num_syllables=None,
+                              budget=None, syllables=None, stresses=None):
+        '''Like get_rhymes, but never cached, and also times each stage of
+        the query and counts the work done by the trie traversal.
+        Returns a tuple of (rhymes, QueryStats)'''
+        if rhyme_type not in ru.RHYME_TYPES:
+            raise ValueError('Unknown rhyme type: {}'.format(rhyme_type))
+        word_filter = ru.make_word_filter(syllables, stresses)
+        stats = QueryStats(word, rhyme_type, num_syllables)
+        stats.start('pattern')
+        try:
+            pattern = ru.get_rhyme_pattern(word, rhyme_type, num_syllables)
+            if pattern is None:
+                return dict(), stats
+            stats.start('traversal')
+            words = self.search_index(pattern)
+            if words is not None:
+                stats.count('indexed')
+                if word_filter is not None:
+                    words = ru.filter_words(words, word_filter)
+                if budget is not None:
+                    words = budget.collect([words])
+            else:
+                syllables = (word_filter.syllables if word_filter is not None
+                             else None)
+                nodes = self.rhyme_trie.search_permutation_roots(
+                    pattern[::-1], stats, budget, syllables)
+                stats.start('sub_words')
+                sub_words = (node.get_sub_words(syllables) for node in nodes)
+                if (word_filter is not None and
+                        word_filter.stresses is not None):
+                    sub_words = (ru.filter_words(words, word_filter)
+                                 for words in sub_words)
+                words = (budget.collect(sub_words) if budget is not None
+                         else list(flatten(sub_words)))
+            stats.count('sub_words', len(words))
+            stats.start('grouping')
+            grouped = group_by_syllables(words)
+            stats.start('sorting')
+            result = {k: list(sort_words(word, v)) for k, v in grouped.items()}
+            stats.count('results', len(words))
+            return result, stats
+        finally:
+            stats.stop()
+
+    def iter_rhymes(self, word, rhyme_type, num_syllables=None, limit=None):
+        '''Generate rhymes of a word one at a time, best first regardless of
+        syllables: words ranked by songStats in sort_words order, then the
+        unranked words. With a limit, stops after that many rhymes; when a
+        search matches many more words than that, the ranked words are tested
+        against the matched trie nodes one by one instead of collecting and
+        sorting every match. The trie is still searched in full first, since
+        the best rhyme can be under any matched node: a limit saves
+        collecting and sorting the words, not the search.
+
+        Arguments:
+            word {str} -- word to rhyme
+            rhyme_type {str} -- one of rhymeUtils.RHYME_TYPES
+
+        Keyword Arguments:
+            num_syllables {int | None} -- as for the get_*_rhymes methods
+                (default: {None})
+            limit {int | None} -- maximum number of rhymes (default: {None})
+
+        Returns:
+            [generator] -- generator of words
+        '''
+        pattern = ru.get_rhyme_pattern(word, rhyme_type, num_syllables)
+        if pattern is None or limit == 0:
+            return
+        pair_dict = get_paired_words(word)
+        words = self.search_index(pattern)
+        if words is not None:
+            yield from self._iter_sorted(word, words, limit, pair_dict)
+            return
+        nodes = self.rhyme_trie.search_permutation_roots(pattern[::-1])
+        # while the matches are only a few times more than needed, sorting
+        # them all is cheapest
+        if (limit is None or sum(node.count_sub_words() for node in nodes)
+                <= max(limit * 8, TOP_K_THRESHOLD)):
+            words = [sub_word for node in nodes
+                     for sub_word in node.get_sub_words()]
+            yield from sort_words(word, words)[:limit]
+            return
+        node_set = set(nodes)
+        count = 0
+        for ranked in iter_ranked_words(word):
+            if self._matches(ranked, node_set):
+                yield ranked
+                count += 1
+                if count == limit:
+                    return
+        # too few ranked rhymes: the rest are unranked, collect them all
+        unranked = (sub_word for node in nodes
+                    for sub_word in node.get_sub_words()
+                    if not is_ranked(sub_word, pair_dict))
+        yield from heapq.nsmallest(limit - count, unranked, key=unranked_key)
+
+    def _iter_sorted(self, word, words, limit, pair_dict):
+        '''iter_rhymes over a list of every matching word'''
+        if limit is None or len(words) <= max(limit * 8, TOP_K_THRESHOLD):
+            yield from sort_words(word, words)[:limit]
+            return
+        word_set = set(words)
+        count = 0
+        for ranked in iter_ranked_words(word):
+            if ranked in word_set:
+                yield ranked
+                count += 1
+                if count == limit:
+                    return
+        unranked = (sub_word for sub_word in words
+                    if not is_ranked(sub_word, pair_dict))
+        yield from heapq.nsmallest(limit - count, unranked, key=unranked_key)
+
+    def _matches(self, word, nodes):
+        '''Tests if a word is under one of a set of trie nodes'''
+        phones = ru.get_word_phones(word)
+        if phones is None:
+            return False
+        node = self.rhyme_trie
+        for phone in reversed(phones):
+            if node in nodes:
+                return True
+            node = node.get_child(phone)
+            if not node:
+                return False
+        return node in nodes
+
+    def batch_rhymes(self, words, types=ru.RHYME_TYPES, num_syllables=None,
+                     processes=None):
+        '''Get rhymes of many words at once. Inputs are grouped by rhyme
+        pattern, so each distinct pattern is searched once, and the words
+        under each matched trie node are collected once per batch.
+
+        Arguments:
+            words {iterable} -- words to rhyme
+
+        Keyword Arguments:
+            types {iterable} -- rhyme type names, see rhymeUtils.RHYME_TYPES
+                (default: {all of them})
+            num_syllables {int | None} -- as for the get_*_rhymes methods
+                (default: {None})
+            processes {int | None} -- if more than 1, search the patterns in
+                a pool of this many worker processes (default: {None})
+
+        Returns:
+            [dict] -- word -> rhyme type -> rhymes, as returned by the
+                get_*_rhymes methods. Words not in the dictionary map to None
+        '''
+        types = tuple(types)
+        results = {}
+        # rhyme pattern -> (word, rhyme type) queries sharing it
+        queries = defaultdict(list)
+        for word in words:
+            if word in results:
+                continue
+            try:
+                patterns = [(rhyme_type, ru.get_rhyme_pattern(
+                    word, rhyme_type, num_syllables)) for rhyme_type in types]
+            except KeyError:
+                results[word] = None
+                continue
+            results[word] = {}
+            for rhyme_type, pattern in patterns:
+                key = (word, rhyme_type, num_syllables, None, None)
+                cached = self.cache.get(key) if self.cache is not None else None
+                if cached is None and num_syllables is None:
+                    cached = self.search_table(word, rhyme_type)
+                    if cached is not None and self.cache is not None:
+                        cached = self.cache.put(key, cached)
+                if cached is not None:
+                    results[word][rhyme_type] = cached
+                elif pattern is None:
+                    results[word][rhyme_type] = dict()
+                else:
+                    queries[pattern].append((word, rhyme_type))
+        if processes and processes > 1 and len(queries) > 1:
+            searched = self._pool_batch_search(list(queries.items()),
+                                               processes)
+        else:
+            searched = self._batch_search(queries.items())
+        for (word, rhyme_type), result in searched:
+            if self.cache is not None:
+                result = self.cache.put((word, rhyme_type, num_syllables,
+                                         None, None),
+                                        result)
+            results[word][rhyme_type] = result
+        return results
+
+    def _batch_search(self, queries):
+        '''Search (pattern, [(word, rhyme type)]) queries, collecting the
+        sub-words of each trie node only once.
+        Returns a generator of ((word, rhyme type), rhymes)'''
+        sub_words = {}
+        for pattern, pattern_queries in queries:
+            result = self.search_index(pattern)
+            if result is None:
+                result = []
+                for node in self.rhyme_trie.search_permutation_roots(
+                        pattern[::-1]):
+                    words = sub_words.get(node)
+                    if words is None:
+                        words = sub_words[node] = list(node.get_sub_words())
+                    result.extend(words)
+            grouped = group_by_syllables(result)
+            for word, rhyme_type in pattern_queries:
+                yield (word, rhyme_type), {k: list(sort_words(word, v))
+                                           for k, v in grouped.items()}
+
+    def _pool_batch_search(self, queries, processes):
+        # a few chunks per worker evens out patterns of very different cost
+        size = -(-len(queries) // (processes * 4))
+        chunks = [queries[i:i + size] for i in range(0, len(queries), size)]
+        with multiprocessing.Pool(processes, initializer=_init_batch_worker,
+                                  initargs=(self.engine,)) as pool:
+            for results in pool.imap_unordered(_batch_search_worker, chunks):
+                yield from results
+
+    @cached_rhymes
+    def get_perfect_rhymes(self, word, num_syllables=None, budget=None,
+                           syllables=None, stresses=None):
         """Get perfect rhymes of a word, defaults to last stressed vowel
 
         Arguments:
@@ -56,15 +578,24 @@ class Phyme(object):
             num_syllables {int | None} -- Number of syllables to check
                 subtractive rhymes for (default: {None}) for last stressed and
                 unstressed
+            budget {QueryBudget | None} -- if set, limits on the search; when
+                one is reached, returns the rhymes found so far and sets
+                budget.truncated (default: {None})
+            syllables {int | None} -- if set, only rhymes of this many
+                syllables. Subtrees of the trie without any are never
+                visited (default: {None})
+            stresses {str | None} -- if set, only rhymes with these vowel
+                stresses, eg '10' (default: {None})
 
         Returns:
             [set] -- set of rhymes
         """
+        return self._search_rhymes(word, 'perfect', num_syllables, budget,
+                                   syllables, stresses)
 
-        phones = ru.get_last_syllables(word, num_syllables)
-        return self.sorted_search(list(flatten(phones)), word)
-
-    def get_family_rhymes(self, word, num_syllables=None):
+    @cached_rhymes
+    def get_family_rhymes(self, word, num_syllables=None, budget=None,
+                          syllables=None, stresses=None):
         '''
         Get words with the same vowel and stress patterns but with consonants
         from the same family (consonants with the same articulation and
@@ -77,21 +608,24 @@ class Phyme(object):
             num_syllables {int | None} -- Number of syllables to check
                 subtractive rhymes for (default: {None}) for last stressed and
                 unstressed
+            budget {QueryBudget | None} -- if set, limits on the search; when
+                one is reached, returns the rhymes found so far and sets
+                budget.truncated (default: {None})
+            syllables {int | None} -- if set, only rhymes of this many
+                syllables. Subtrees of the trie without any are never
+                visited (default: {None})
+            stresses {str | None} -- if set, only rhymes with these vowel
+                stresses, eg '10' (default: {None})
 
         Returns:
             [set] -- set of rhymes
         '''
-        phones = ru.get_last_syllables(word, num_syllables)
-        if not ru.is_consonant(phones[0][-1]):
-            return dict()
-        phones = flatten(phones)
-        phones = map(lambda phone: PermutedPhone(phone, Permutations.FAMILY)
-                     if ru.is_consonant(phone)
-                     else phone,
-                     phones)
-        return self.sorted_search(phones, word)
+        return self._search_rhymes(word, 'family', num_syllables, budget,
+                                   syllables, stresses)
 
-    def get_partner_rhymes(self, word, num_syllables=None):
+    @cached_rhymes
+    def get_partner_rhymes(self, word, num_syllables=None, budget=None,
+                           syllables=None, stresses=None):
         '''
         Get words with the same vowel and stress patterns but with partner
         consonants (consonants with the same articulation) (HAWK -> DOG)
@@ -103,21 +637,24 @@ class Phyme(object):
             num_syllables {int | None} -- Number of syllables to check
                 subtractive rhymes for (default: {None}) for last stressed and
                 unstressed
+            budget {QueryBudget | None} -- if set, limits on the search; when
+                one is reached, returns the rhymes found so far and sets
+                budget.truncated (default: {None})
+            syllables {int | None} -- if set, only rhymes of this many
+                syllables. Subtrees of the trie without any are never
+                visited (default: {None})
+            stresses {str | None} -- if set, only rhymes with these vowel
+                stresses, eg '10' (default: {None})
 
         Returns:
             [set] -- set of rhymes
         '''
-        phones = ru.get_last_syllables(word, num_syllables)
-        if not ru.is_consonant(phones[0][-1]):
-            return dict()
-        phones = flatten(phones)
-        phones = map(lambda phone: PermutedPhone(phone, Permutations.PARTNER)
-                     if ru.is_consonant(phone)
-                     else phone,
-                     phones)
-        return self.sorted_search(phones, word)
+        return self._search_rhymes(word, 'partner', num_syllables, budget,
+                                   syllables, stresses)
 
-    def get_additive_rhymes(self, word, num_syllables=None):
+    @cached_rhymes
+    def get_additive_rhymes(self, word, num_syllables=None, budget=None,
+                            syllables=None, stresses=None):
         '''
         Get words with the same vowel and stress patterns but including
         additional consonants (MATTER -> MASTER)
@@ -129,17 +666,24 @@ class Phyme(object):
             num_syllables {int | None} -- Number of syllables to check
                 subtractive rhymes for (default: {None}) for last stressed and
                 unstressed
+            budget {QueryBudget | None} -- if set, limits on the search; when
+                one is reached, returns the rhymes found so far and sets
+                budget.truncated (default: {None})
+            syllables {int | None} -- if set, only rhymes of this many
+                syllables. Subtrees of the trie without any are never
+                visited (default: {None})
+            stresses {str | None} -- if set, only rhymes with these vowel
+                stresses, eg '10' (default: {None})
 
         Returns:
             [set] -- set of rhymes
         '''
-        phones = ru.get_last_syllables(word, num_syllables)
-        phones = flatten(phones)
-        phones = map(lambda phone: PermutedPhone(phone, Permutations.ADDITIVE),
-                     phones)
-        return self.sorted_search(phones, word)
+        return self._search_rhymes(word, 'additive', num_syllables, budget,
+                                   syllables, stresses)
 
-    def get_subtractive_rhymes(self, word, num_syllables=None):
+    @cached_rhymes
+    def get_subtractive_rhymes(self, word, num_syllables=None, budget=None,
+                               syllables=None, stresses=None):
         '''
         Get words with the same vowel and stress patterns but dropping some
         consonants (MASTER -> MATTER)
@@ -151,21 +695,24 @@ class Phyme(object):
             num_syllables {int | None} -- Number of syllables to check
                 subtractive rhymes for (default: {None}) for last stressed and
                 unstressed
+            budget {QueryBudget | None} -- if set, limits on the search; when
+                one is reached, returns the rhymes found so far and sets
+                budget.truncated (default: {None})
+            syllables {int | None} -- if set, only rhymes of this many
+                syllables. Subtrees of the trie without any are never
+                visited (default: {None})
+            stresses {str | None} -- if set, only rhymes with these vowel
+                stresses, eg '10' (default: {None})
 
         Returns:
             [set] -- set of rhymes
         '''
-        phones = ru.get_last_syllables(word, num_syllables)
-        if not ru.is_consonant(phones[0][-1]):
-            return dict()
-        phones = flatten(phones)
-        phones = map(lambda phone: PermutedPhone(phone, Permutations.SUBTRACTIVE)
-                     if ru.is_consonant(phone)
-                     else phone,
-                     phones)
-        return self.sorted_search(phones, word)
+        return self._search_rhymes(word, 'subtractive', num_syllables, budget,
+                                   syllables, stresses)
 
-    def get_consonant_rhymes(self, word, num_syllables=None):
+    @cached_rhymes
+    def get_consonant_rhymes(self, word, num_syllables=None, budget=None,
+                             syllables=None, stresses=None):
         '''
         Get words with the same stress patterns and consonants but with
         arbitrary vowels (DOG -> BAG)
@@ -177,19 +724,24 @@ class Phyme(object):
             num_syllables {int | None} -- Number of syllables to check
                 subtractive rhymes for (default: {None}) for last stressed and
                 unstressed
+            budget {QueryBudget | None} -- if set, limits on the search; when
+                one is reached, returns the rhymes found so far and sets
+                budget.truncated (default: {None})
+            syllables {int | None} -- if set, only rhymes of this many
+                syllables. Subtrees of the trie without any are never
+                visited (default: {None})
+            stresses {str | None} -- if set, only rhymes with these vowel
+                stresses, eg '10' (default: {None})
 
         Returns:
             [set] -- set of rhymes
         '''
-        phones = ru.get_last_syllables(word, num_syllables)
-        phones = flatten(phones)
-        phones = map(lambda phone: PermutedPhone(phone, Permutations.CONSONANT)
-                     if ru.is_vowel(phone)
-                     else phone,
-                     phones)
-        return self.sorted_search(phones, word)
+        return self._search_rhymes(word, 'consonant', num_syllables, budget,
+                                   syllables, stresses)
 
-    def get_assonance_rhymes(self, word, num_syllables=None):
+    @cached_rhymes
+    def get_assonance_rhymes(self, word, num_syllables=None, budget=None,
+                             syllables=None, stresses=None):
         '''
         Get words with the same vowels and stress patterns but arbitrary
         consonants (JAUNT -> DOG)
@@ -201,17 +753,24 @@ class Phyme(object):
             num_syllables {int | None} -- Number of syllables to check
                 subtractive rhymes for (default: {None}) for last stressed and
                 unstressed
+            budget {QueryBudget | None} -- if set, limits on the search; when
+                one is reached, returns the rhymes found so far and sets
+                budget.truncated (default: {None})
+            syllables {int | None} -- if set, only rhymes of this many
+                syllables. Subtrees of the trie without any are never
+                visited (default: {None})
+            stresses {str | None} -- if set, only rhymes with these vowel
+                stresses, eg '10' (default: {None})
 
         Returns:
             [set] -- set of rhymes
         '''
-        phones = ru.get_last_syllables(word, num_syllables)
-        phones = flatten(phones)
-        phones = map(lambda phone: PermutedPhone(phone, Permutations.ADDITIVE),
-                     filter(lambda phone: ru.is_vowel(phone), phones))
-        return self.sorted_search(phones, word)
+        return self._search_rhymes(word, 'assonance', num_syllables, budget,
+                                   syllables, stresses)
 
-    def get_substitution_rhymes(self, word, num_syllables=None):
+    @cached_rhymes
+    def get_substitution_rhymes(self, word, num_syllables=None, budget=None,
+                                syllables=None, stresses=None):
         '''
         Get words with the same vowels and stress patterns but substitute
         arbitrary consonants (FASTER -> FACTOR)
@@ -223,25 +782,159 @@ class Phyme(object):
             num_syllables {int | None} -- Number of syllables to check
                 subtractive rhymes for (default: {None}) for last stressed and
                 unstressed
+            budget {QueryBudget | None} -- if set, limits on the search; when
+                one is reached, returns the rhymes found so far and sets
+                budget.truncated (default: {None})
+            syllables {int | None} -- if set, only rhymes of this many
+                syllables. Subtrees of the trie without any are never
+                visited (default: {None})
+            stresses {str | None} -- if set, only rhymes with these vowel
+                stresses, eg '10' (default: {None})
 
         Returns:
             [set] -- set of rhymes
         '''
-        phones = ru.get_last_syllables(word, num_syllables)
-        phones = flatten(phones)
-        phones = map(lambda phone: PermutedPhone(phone, Permutations.SUBSTITUTION)
-                     if ru.is_consonant(phone)
-                     else phone,
-                     phones)
-        return self.sorted_search(phones, word)
-
-
-def load_rhyme_trie():
-    global _rt
-    if _rt:
-        return _rt
-    word_phone_dict = load_word_phone_dict()
-    _rt = RhymeTrieNode(None, None)
-    for word, phones in word_phone_dict.items():
-        _rt.insert(phones[::-1], word)
-    return _rt
+        return self._search_rhymes(word, 'substitution', num_syllables, budget,
+                                   syllables, stresses)
+
+
+_batch_worker = None
+
+
+def _init_batch_worker(engine):
+    global _batch_worker
+    _batch_worker = Phyme(engine)
+
+
+def _batch_search_worker(queries):
+    return list(_batch_worker._batch_search(queries))
+
+
+@load_once
+def get_table_words():
+    '''Returns the sorted list of every word in the rhyme trie, which number
+    the words of a RhymeTable'''
+    return sorted({word.lower() for word in load_word_phone_dict()})
+
+
+@load_once
+def get_table_word_ids():
+    '''Returns a dict of word -> id in get_table_words()'''
+    return {word: i for i, word in enumerate(get_table_words())}
+
+
+def _rank_patterns(patterns):
+    '''Search rhyme patterns with this process's batch worker, for a
+    RhymeTable. Returns per pattern a list of (syllables, array of word
+    ids), the words in sort order for no pair ranks'''
+    word_ids = get_table_word_ids()
+    ranking = load_song_ranking()
+    results = []
+    for pattern in patterns:
+        grouped = _batch_worker.search_permutations(pattern)
+        results.append([(syllables, array('I', map(word_ids.__getitem__,
+                                                   ranking.sort(words, {}))))
+                        for syllables, words in grouped.items()])
+    return results
+
+
+def build_rhyme_table(words, processes=None, chunk_size=64):
+    '''Compute the rhymes of every rhyme type of words, with the default
+    number of syllables. Each rhyme pattern is searched once however many
+    words share it, spread over a pool of processes if processes is more
+    than 1. Words not in the dictionary are left out. Returns a RhymeTable'''
+    queries = []
+    # rhyme pattern -> pattern id
+    patterns = {}
+    for word in words:
+        try:
+            word_patterns = [ru.get_rhyme_pattern(word, rhyme_type)
+                             for rhyme_type in ru.RHYME_TYPES]
+        except KeyError:
+            continue
+        queries.append((word, [
+            None if pattern is None else
+            patterns.setdefault(pattern, len(patterns))
+            for pattern in word_patterns]))
+    patterns = list(patterns)
+    chunks = [patterns[i:i + chunk_size]
+              for i in range(0, len(patterns), chunk_size)]
+    if processes and processes > 1:
+        with multiprocessing.Pool(processes, initializer=_init_batch_worker,
+                                  initargs=('flat',)) as pool:
+            ranked = flatten(pool.imap(_rank_patterns, chunks))
+            return RhymeTable.build(get_table_words(), ru.RHYME_TYPES,
+                                    queries, ranked)
+    _init_batch_worker('flat')
+    return RhymeTable.build(get_table_words(), ru.RHYME_TYPES, queries,
+                            flatten(map(_rank_patterns, chunks)))
+
+
+def group_by_syllables(words):
+    '''Group words by their number of syllables, read from the precomputed
+    word info table. Returns a dict of syllables -> list of words, ordered
+    by syllables'''
+    word_info = ru.load_word_info()
+    groups = defaultdict(list)
+    for word in words:
+        groups[word_info[word].syllables].append(word)
+    return dict(sorted(groups.items()))
+
+
+def load_rhyme_trie(engine='flat'):
+    '''Load the rhyme trie. The 'flat' engine memory-maps the prebuilt
+    snapshot if there is one and otherwise builds a compact FlatRhymeTrie; the
+    'node' engine builds a trie of RhymeTrieNode objects'''
+    rt = _rt.get(engine)
+    if rt:
+        return rt
+    if engine == 'flat':
+        rt = load_rhyme_trie_snapshot()
+        if rt is None:
+            rt = FlatRhymeTrie.build(load_word_phone_dict()).root
+    elif engine == 'node':
+        word_phone_dict = load_word_phone_dict()
+        rt = RhymeTrieNode.build(sorted(
+            (phones[::-1], word) for word, phones in word_phone_dict.items()))
+    else:
+        raise ValueError('Unknown rhyme trie engine: {}'.format(engine))
+    _rt[engine] = rt
+    return rt
+
+
+@load_once
+def load_rhyme_index():
+    '''Load the RhymeIndex, memory-mapped from the file written by
+    make_files.py if there is one and otherwise built'''
+    if os.path.exists(RHYME_INDEX_PATH):
+        try:
+            return RhymeIndex.load(RHYME_INDEX_PATH)
+        except (ValueError, struct.error) as e:
+            warnings.warn('Ignoring rhyme index: {}'.format(e))
+    return RhymeIndex.build(load_word_phone_dict())
+
+
+@load_once
+def load_rhyme_table():
+    '''Load the RhymeTable, memory-mapped from the file written by
+    make_files.py. Returns None if there is no usable file: unlike the other
+    data, the table takes too long to build on the fly'''
+    if not os.path.exists(RHYME_TABLE_PATH):
+        return None
+    try:
+        return RhymeTable.load(RHYME_TABLE_PATH)
+    except (ValueError, struct.error) as e:
+        warnings.warn('Ignoring rhyme table: {}'.format(e))
+        return None
+
+
+def load_rhyme_trie_snapshot(path=SNAPSHOT_PATH):
+    '''Memory-map a rhyme trie snapshot written by make_files.py
+    Returns the root node, or None if there is no usable snapshot'''
+    if not os.path.exists(path):
+        return None
+    try:
+        return FlatRhymeTrie.load(path).root
+    except (ValueError, struct.error) as e:
+        warnings.warn('Ignoring rhyme trie snapshot: {}'.format(e))
+        return None
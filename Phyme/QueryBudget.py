@@ -0,0 +1,82 @@
+'''Limits on the work of a rhyme query'''
+import time
+
+# budget limits, as set in QueryBudget.truncated when one is reached
+LIMITS = ('max_nodes', 'max_results', 'timeout', 'cancelled')
+
+
+class QueryBudget(object):
+    '''Limits on one rhyme query, passed to the Phyme.get_*_rhymes methods.
+    When a limit is reached the query stops early and returns the rhymes
+    found so far, and truncated is set to the name of the limit (see LIMITS).
+
+    max_nodes   -- (trie node, pattern position) states the traversal may
+                   visit
+    max_results -- rhymes the query may collect. They are the first ones
+                   found, not the best ones
+    timeout     -- seconds the query may take, counted from the creation of
+                   the budget
+
+    A budget can also be cancelled, eg from another thread. Budgets are for
+    one query: a truncated budget stops every later query at once.'''
+
+    # the traversal reads the clock once every this many visits
+    CLOCK_INTERVAL = 64
+
+    def __init__(self, max_nodes=None, max_results=None, timeout=None):
+        self.max_nodes = max_nodes
+        self.max_results = max_results
+        self.deadline = (None if timeout is None
+                         else time.perf_counter() + timeout)
+        self.truncated = None
+        self.cancelled = False
+        self._visits = 0
+
+    def __repr__(self):
+        return ('QueryBudget(max_nodes={}, max_results={}, truncated={!r})'
+                .format(self.max_nodes, self.max_results, self.truncated))
+
+    def cancel(self):
+        '''Stop the query at its next check'''
+        self.cancelled = True
+
+    def truncate(self, limit):
+        '''Record the first limit reached. Returns True'''
+        if self.truncated is None:
+            self.truncated = limit
+        return True
+
+    def check(self):
+        '''Returns True if the query must stop: a limit was reached, it was
+        cancelled or it is past its deadline'''
+        if self.truncated is not None:
+            return True
+        if self.cancelled:
+            return self.truncate('cancelled')
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            return self.truncate('timeout')
+        return False
+
+    def visit(self, nodes):
+        '''Called by trie traversals for every state they expand, with the
+        number of states visited so far. Returns True if they must stop'''
+        if self.max_nodes is not None and nodes > self.max_nodes:
+            return self.truncate('max_nodes')
+        self._visits += 1
+        if self._visits % self.CLOCK_INTERVAL:
+            return self.truncated is not None
+        return self.check()
+
+    def collect(self, word_lists):
+        '''Concatenate lists of words while the budget lasts, up to
+        max_results words. Returns a list of words'''
+        words = []
+        for sub_words in word_lists:
+            if self.check():
+                break
+            words.extend(sub_words)
+            if self.max_results is not None and len(words) > self.max_results:
+                del words[self.max_results:]
+                self.truncate('max_results')
+                break
+        return words
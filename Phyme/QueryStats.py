@@ -0,0 +1,63 @@
+'''Per-stage timings and counters of a rhyme query'''
+import time
+from collections import OrderedDict, defaultdict
+
+# query stages, in the order they run
+STAGES = ('pattern', 'traversal', 'sub_words', 'grouping', 'sorting')
+
+
+class QueryStats(object):
+    '''Timings and counters of one rhyme query, filled in by
+    Phyme.get_rhymes_with_stats and passed to a Phyme's stats_hook.
+
+    timings  -- stage name -> seconds, see STAGES
+    counters -- name -> count:
+        states    -- (node, pattern position) states the traversal expanded
+        nodes     -- distinct trie nodes among those states
+        matches   -- nodes matching the whole pattern
+        roots     -- matching nodes left after dropping nested ones
+        sub_words -- words enumerated under the roots
+        results   -- rhymes returned
+        indexed   -- 1 if the words were looked up in the RhymeIndex, in the
+                     traversal stage, instead of searching the trie'''
+
+    def __init__(self, word, rhyme_type, num_syllables=None):
+        self.word = word
+        self.rhyme_type = rhyme_type
+        self.num_syllables = num_syllables
+        self.timings = OrderedDict((stage, 0.0) for stage in STAGES)
+        self.counters = defaultdict(int)
+        self._stage = None
+        self._start = None
+
+    def __repr__(self):
+        return 'QueryStats({!r}, {!r}, {}ms, {})'.format(
+            self.word, self.rhyme_type, round(self.total * 1e3, 3),
+            dict(self.counters))
+
+    @property
+    def total(self):
+        '''Total seconds over every stage'''
+        return sum(self.timings.values())
+
+    def start(self, stage):
+        '''Start timing a stage, ending the current one'''
+        now = time.perf_counter()
+        if self._stage is not None:
+            self.timings[self._stage] += now - self._start
+        self._stage = stage
+        self._start = now
+
+    def stop(self):
+        '''End the current stage'''
+        self.start(None)
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def as_dict(self):
+        '''Returns a JSON-serializable dict of the stats'''
+        return {'word': self.word, 'rhyme_type': self.rhyme_type,
+                'num_syllables': self.num_syllables,
+                'timings': dict(self.timings),
+                'counters': dict(self.counters)}
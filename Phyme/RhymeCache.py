@@ -0,0 +1,92 @@
+'''Bounded LRU cache for rhyme query results'''
+import threading
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from types import MappingProxyType
+
+CacheStats = namedtuple('CacheStats', ['hits', 'misses', 'evictions', 'size',
+                                       'maxsize'])
+
+
+class RhymeCache(object):
+    '''A thread-safe, size-bounded LRU cache. Values are frozen on insert so
+    that callers can't mutate what later callers will be served.'''
+
+    def __init__(self, maxsize):
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        '''Get a cached value, marking it as most recently used'''
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        '''Cache a value, evicting the least recently used ones over maxsize.
+        Returns the frozen value'''
+        value = freeze_result(value)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        '''Returns a CacheStats of the hit, miss and eviction counters'''
+        with self._lock:
+            return CacheStats(self.hits, self.misses, self.evictions,
+                              len(self._entries), self.maxsize)
+
+
+def freeze_result(result):
+    '''Make a dict of syllables -> list of words read-only'''
+    return MappingProxyType({k: tuple(v) for k, v in result.items()})
+
+
+def cached_rhymes(method):
+    '''Decorator for Phyme.get_*_rhymes methods that serves repeated
+    (word, rhyme type, num_syllables, syllables, stresses) queries from the
+    instance's cache, if it has one. Results truncated by a QueryBudget are
+    not cached'''
+    rhyme_type = method.__name__[len('get_'):-len('_rhymes')]
+
+    @wraps(method)
+    def wrapper(self, word, num_syllables=None, budget=None, syllables=None,
+                stresses=None):
+        cache = self.cache
+        if cache is None:
+            return method(self, word, num_syllables, budget, syllables,
+                          stresses)
+        key = (word, rhyme_type, num_syllables, syllables, stresses)
+        result = cache.get(key)
+        if result is None:
+            result = method(self, word, num_syllables, budget, syllables,
+                            stresses)
+            if budget is None or budget.truncated is None:
+                result = cache.put(key, result)
+            else:
+                result = freeze_result(result)
+        return result
+    return wrapper
@@ -0,0 +1,167 @@
+'''Secondary rhyme indexes that answer assonance and consonant rhyme queries
+with a binary search instead of a trie traversal'''
+from array import array
+from bisect import bisect_left, bisect_right
+from .IOUtil import map_sections, write_sections
+from .rhymeUtils import (PermutedPhone, Permutations, get_phone_ids,
+                         get_vowels, is_vowel)
+
+MAGIC = b'PHYMINDX'
+VERSION = 1
+# stands for any vowel in consonant skeletons
+VOWEL_SLOT = 0xFF
+INDEXES = ('assonance', 'consonant')
+
+# (name, array typecode) of each section, in file order
+SECTIONS = tuple(section for name in INDEXES for section in (
+    (name + '_order', 'I'),
+    (name + '_key_offsets', 'I'),
+    (name + '_key_blob', 'B'),
+)) + (('word_blob', 'B'),)
+
+
+def _vowel_ids():
+    phone_ids = get_phone_ids()
+    return frozenset(phone_ids[phone] for phone in get_vowels()
+                     if phone in phone_ids)
+
+
+def make_key(name, reversed_ids, vowel_ids):
+    '''Returns the skeleton of a pronunciation, given as reversed phone ids:
+    its vowels for assonance, its phones with every vowel as VOWEL_SLOT for
+    consonant rhymes'''
+    if name == 'assonance':
+        return bytes(i for i in reversed_ids if i in vowel_ids)
+    return bytes(VOWEL_SLOT if i in vowel_ids else i for i in reversed_ids)
+
+
+def get_pattern_key(pattern):
+    '''Returns (index name, skeleton prefix) of the words matching a rhyme
+    pattern, or None if no index can answer it. Assonance patterns are all
+    additive vowels, consonant patterns plain consonants and vowels permuted
+    to any vowel'''
+    phone_ids = get_phone_ids()
+    phones = list(reversed(pattern))
+    if phones and all(isinstance(phone, PermutedPhone) and
+                      phone.permutation is Permutations.ADDITIVE and
+                      is_vowel(phone.phone) for phone in phones):
+        return 'assonance', bytes(phone_ids[phone.phone] for phone in phones)
+    key = bytearray()
+    for phone in phones:
+        if isinstance(phone, PermutedPhone):
+            if phone.permutation is not Permutations.CONSONANT:
+                return None
+            key.append(VOWEL_SLOT)
+        elif is_vowel(phone):
+            return None
+        else:
+            key.append(phone_ids[phone])
+    if VOWEL_SLOT not in key:
+        return None
+    return 'consonant', bytes(key)
+
+
+class _PrefixKeys(object):
+    '''The skeletons of an index's order cut to a prefix size, read on
+    demand, as a sequence to bisect'''
+
+    def __init__(self, order, offsets, blob, size):
+        self.order = order
+        self.offsets = offsets
+        self.blob = blob
+        self.size = size
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, i):
+        word_id = self.order[i]
+        start = self.offsets[word_id]
+        return bytes(self.blob[start:min(start + self.size,
+                                         self.offsets[word_id + 1])])
+
+
+class RhymeIndex(object):
+    '''Words sorted by the skeletons of their reversed pronunciations:
+
+    words                 -- per word id, the word. Ids number the words in
+                             the depth-first order of FlatRhymeTrie
+    {name}_order          -- word ids sorted by skeleton, then id
+    {name}_key_offsets    -- per word id, offset of its skeleton in
+                             {name}_key_blob (n_words + 1)
+
+    for each name in INDEXES. The words rhyming with a pattern are those
+    whose skeleton starts with the pattern's, which are a contiguous run of
+    the order. Arrays may be array.array objects or memoryviews over a
+    memory-mapped file.'''
+
+    def __init__(self, words, sections, buffer=None):
+        self.words = words
+        self.sections = sections
+        # keep the mmap alive for as long as the views into it are
+        self._buffer = buffer
+
+    def __len__(self):
+        return len(self.words)
+
+    def get_key(self, name, word_id):
+        '''Returns the skeleton of a word id in an index'''
+        offsets = self.sections[name + '_key_offsets']
+        return bytes(self.sections[name + '_key_blob'][
+            offsets[word_id]:offsets[word_id + 1]])
+
+    def get_range(self, name, prefix):
+        '''Returns the (start, end) of the run of an index's order whose
+        skeletons start with prefix'''
+        keys = _PrefixKeys(self.sections[name + '_order'],
+                           self.sections[name + '_key_offsets'],
+                           self.sections[name + '_key_blob'], len(prefix))
+        return bisect_left(keys, prefix), bisect_right(keys, prefix)
+
+    def search(self, pattern):
+        '''Look up the words matching a rhyme pattern, in pronunciation order.
+        Returns a list of words in the order a FlatRhymeTrie search finds
+        them, or None if the pattern is not indexed'''
+        found = get_pattern_key(pattern)
+        if found is None:
+            return None
+        name, prefix = found
+        start, end = self.get_range(name, prefix)
+        word_ids = self.sections[name + '_order'][start:end].tolist()
+        word_ids.sort()
+        return list(map(self.words.__getitem__, word_ids))
+
+    @classmethod
+    def build(cls, word_phone_dict):
+        '''Build the indexes from a dict of word -> phones'''
+        phone_ids = get_phone_ids()
+        vowel_ids = _vowel_ids()
+        # the same (reversed phone ids, word) order as FlatRhymeTrie words
+        keyed = sorted(set((tuple(phone_ids[phone] for phone in phones[::-1]),
+                            word.lower())
+                           for word, phones in word_phone_dict.items()))
+        sections = {}
+        for name in INDEXES:
+            keys = [make_key(name, reversed_ids, vowel_ids)
+                    for reversed_ids, _ in keyed]
+            key_offsets = array('I', [0])
+            for key in keys:
+                key_offsets.append(key_offsets[-1] + len(key))
+            sections[name + '_order'] = array('I', sorted(
+                range(len(keys)), key=keys.__getitem__))
+            sections[name + '_key_offsets'] = key_offsets
+            sections[name + '_key_blob'] = b''.join(keys)
+        return cls([word for _, word in keyed], sections)
+
+    def save(self, path):
+        '''Write the indexes to a binary file'''
+        sections = dict(self.sections)
+        sections['word_blob'] = '\n'.join(self.words).encode('utf-8')
+        write_sections(path, MAGIC, VERSION, SECTIONS, sections)
+
+    @classmethod
+    def load(cls, path):
+        '''Memory-map a file written by save()'''
+        sections, buffer = map_sections(path, MAGIC, VERSION, SECTIONS)
+        words = bytes(sections.pop('word_blob')).decode('utf-8').split('\n')
+        return cls(words, sections, buffer)
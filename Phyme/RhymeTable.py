@@ -0,0 +1,141 @@
+'''Rhymes of the most frequent words, computed ahead of time by make_files.py
+so that queries for them are lookups instead of searches'''
+from array import array
+from .IOUtil import map_sections, write_sections
+
+MAGIC = b'PHYMTABL'
+VERSION = 1
+NO_PATTERN = 0xFFFFFFFF
+
+# (name, array typecode) of each section, in file order
+SECTIONS = (
+    ('query_patterns', 'I'),
+    ('pattern_groups', 'I'),
+    ('group_start', 'I'),
+    ('result_ids', 'I'),
+    ('group_syllables', 'B'),
+    ('word_blob', 'B'),
+    ('query_blob', 'B'),
+    ('type_blob', 'B'),
+)
+
+
+class RhymeTable(object):
+    '''The rhymes of every rhyme type of a set of query words, with the
+    default number of syllables:
+
+    words           -- per word id, the word
+    queries         -- per query, the query word, sorted
+    rhyme_types     -- the rhyme types, in query_patterns order
+    query_patterns  -- per query and rhyme type (n_queries * n_types), id of
+                       its rhyme pattern, NO_PATTERN if the word has none
+    pattern_groups  -- per pattern, offset of its first group (CSR,
+                       n_patterns + 1)
+    group_syllables -- per group, the syllables of its words
+    group_start     -- per group, offset of its first word (CSR,
+                       n_groups + 1)
+    result_ids      -- word ids of the rhymes of each group, in
+                       SongRanking.sort order for an input word without pair
+                       ranks
+
+    Words sharing a rhyme pattern share its rhymes. They differ only in the
+    order of the words they are paired with, which SongRanking.resort moves
+    into place. Arrays may be array.array objects or memoryviews over a
+    memory-mapped file.'''
+
+    def __init__(self, words, queries, rhyme_types, sections, buffer=None):
+        self.words = words
+        self.queries = queries
+        self.query_ids = {query: i for i, query in enumerate(queries)}
+        self.rhyme_types = tuple(rhyme_types)
+        self.type_ids = {rhyme_type: i
+                         for i, rhyme_type in enumerate(self.rhyme_types)}
+        self.sections = sections
+        # keep the mmap alive for as long as the views into it are
+        self._buffer = buffer
+
+    def __len__(self):
+        return len(self.queries)
+
+    def __contains__(self, word):
+        return word in self.query_ids
+
+    def get_groups(self, word, rhyme_type):
+        '''Look up the rhymes of a query word.
+        Returns a list of (syllables, list of words), ordered by syllables,
+        with the words of each in SongRanking.sort order for no pair ranks,
+        or None if the table does not have the word or rhyme type'''
+        query = self.query_ids.get(word)
+        type_id = self.type_ids.get(rhyme_type)
+        if query is None or type_id is None:
+            return None
+        sections = self.sections
+        pattern = sections['query_patterns'][query * len(self.rhyme_types) +
+                                             type_id]
+        if pattern == NO_PATTERN:
+            return []
+        pattern_groups = sections['pattern_groups']
+        group_start = sections['group_start']
+        group_syllables = sections['group_syllables']
+        result_ids = sections['result_ids']
+        words = self.words
+        groups = []
+        for group in range(pattern_groups[pattern],
+                           pattern_groups[pattern + 1]):
+            word_ids = result_ids[group_start[group]:group_start[group + 1]]
+            groups.append((group_syllables[group],
+                           list(map(words.__getitem__, word_ids.tolist()))))
+        return groups
+
+    @classmethod
+    def build(cls, words, rhyme_types, queries, pattern_results):
+        '''Build a table.
+
+        Arguments:
+            words {list} -- every word the rhymes are made of
+            rhyme_types {sequence} -- the rhyme types
+            queries {list} -- (query word, [pattern id or None per rhyme
+                type]) tuples
+            pattern_results {iterable} -- per pattern id, in order, a list
+                of (syllables, array of word ids) groups
+        '''
+        queries = sorted(queries)
+        # every section but the blobs, which save() writes
+        sections = {name: array(typecode) for name, typecode in SECTIONS[:-3]}
+        sections['query_patterns'].extend(
+            NO_PATTERN if pattern is None else pattern
+            for _, patterns in queries for pattern in patterns)
+        pattern_groups = sections['pattern_groups']
+        group_start = sections['group_start']
+        group_syllables = sections['group_syllables']
+        result_ids = sections['result_ids']
+        pattern_groups.append(0)
+        group_start.append(0)
+        for groups in pattern_results:
+            for syllables, ids in groups:
+                group_syllables.append(syllables)
+                result_ids.extend(ids)
+                group_start.append(len(result_ids))
+            pattern_groups.append(len(group_syllables))
+        return cls(words, [word for word, _ in queries], rhyme_types,
+                   sections)
+
+    def save(self, path):
+        '''Write the table to a binary file'''
+        sections = dict(self.sections)
+        sections['word_blob'] = '\n'.join(self.words).encode('utf-8')
+        sections['query_blob'] = '\n'.join(self.queries).encode('utf-8')
+        sections['type_blob'] = '\n'.join(self.rhyme_types).encode('ascii')
+        write_sections(path, MAGIC, VERSION, SECTIONS, sections)
+
+    @classmethod
+    def load(cls, path):
+        '''Memory-map a file written by save()'''
+        sections, buffer = map_sections(path, MAGIC, VERSION, SECTIONS)
+        words, queries = ([] if not blob else
+                          bytes(blob).decode('utf-8').split('\n')
+                          for blob in (sections.pop('word_blob'),
+                                       sections.pop('query_blob')))
+        rhyme_types = bytes(sections.pop('type_blob')).decode(
+            'ascii').split('\n')
+        return cls(words, queries, rhyme_types, sections, buffer)
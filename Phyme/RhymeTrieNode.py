@@ -1,66 +1,238 @@
-from .rhymeUtils import (PermutedPhone, Permutations, permutation_getters,
-                         CONSONANTS)
+from .rhymeUtils import (Permutations, get_consonants, get_phones_by_id,
+                         get_phone_ids, get_phone_mask, get_vowels,
+                         iter_mask_ids, merge_patterns, count_vowels)
 
 
 class RhymeTrieNode(object):
+    __slots__ = ('children', 'child_mask', 'parent', 'phone', 'words',
+                 'min_syllables', 'max_syllables')
 
     def __init__(self, phone, parent):
         self.children = {}
+        # bits of the phone ids of the children
+        self.child_mask = 0
         self.parent = parent
         self.phone = phone
         self.words = set()
+        # range of the syllables of the words under this node, inclusive.
+        # The words of a node all have the syllables of its path, and
+        # deeper words have at least as many
+        self.min_syllables = 0
+        self.max_syllables = 0
+
+    @classmethod
+    def build(cls, entries):
+        '''Build a trie in one pass from (phones, word) entries, typically
+        reversed pronunciations. Each entry only walks the part of its phones
+        not shared with the previous entry, so entries sorted by phones are
+        built fastest, but any order gives the same trie.
+        Returns the root node'''
+        phone_ids = get_phone_ids()
+        vowels = get_vowels()
+        root = cls(None, None)
+        path = [root]
+        # vowels on the path to each node of path
+        path_vowels = [0]
+        previous = ()
+        for phones, word in entries:
+            common = 0
+            for phone, previous_phone in zip(phones, previous):
+                if phone != previous_phone:
+                    break
+                common += 1
+            del path[common + 1:]
+            del path_vowels[common + 1:]
+            node = path[-1]
+            for i in range(common, len(phones)):
+                phone = phones[i]
+                child = node.children.get(phone)
+                if child is None:
+                    child = node._add_child(phone, phone_ids)
+                path.append(child)
+                path_vowels.append(path_vowels[-1] + (phone in vowels))
+                node = child
+            node.words.add(word.lower())
+            for ancestor in path:
+                ancestor._add_syllables(max(path_vowels[-1], 1))
+            previous = phones
+        return root
 
     def insert(self, phones, word):
         '''Insert a list of phones into this node and its children. Returns the final node of the insert.'''
-        if not phones:
-            self.words.add(word.lower())
-            return self
-        child_node = self.children.get(phones[0])
-        if child_node is None:
-            child_node = RhymeTrieNode(phones[0], self)
-            self.children[phones[0]] = child_node
-        remaining_phones = phones[1:]
-        return child_node.insert(remaining_phones, word)
+        phone_ids = get_phone_ids()
+        node = self
+        for phone in phones:
+            child = node.children.get(phone)
+            if child is None:
+                child = node._add_child(phone, phone_ids)
+            node = child
+        node.words.add(word.lower())
+        syllables = max(count_vowels(node.assemble()), 1)
+        ancestor = node
+        while ancestor is not None:
+            ancestor._add_syllables(syllables)
+            ancestor = ancestor.parent
+        return node
+
+    def _add_syllables(self, syllables):
+        if not self.max_syllables:
+            self.min_syllables = self.max_syllables = syllables
+        elif syllables < self.min_syllables:
+            self.min_syllables = syllables
+        elif syllables > self.max_syllables:
+            self.max_syllables = syllables
+
+    def has_syllables(self, syllables):
+        '''Tests if words of a number of syllables may be under this node'''
+        return self.min_syllables <= syllables <= self.max_syllables
+
+    def _add_child(self, phone, phone_ids):
+        child = type(self)(phone, self)
+        self.children[phone] = child
+        if phone in phone_ids:
+            self.child_mask |= 1 << phone_ids[phone]
+        return child
+
+    def get_child(self, phone):
+        '''Returns the child node along a phone, or None'''
+        return self.children.get(phone)
+
+    def get_masked_children(self, mask):
+        '''Returns a generator of the child nodes along the phones whose ids
+        are set in a mask (see rhymeUtils.get_phone_class_mask)'''
+        phones = get_phones_by_id()
+        children = self.children
+        for phone_id in iter_mask_ids(self.child_mask & mask):
+            yield children[phones[phone_id]]
 
     def contains(self, phones):
         '''Given a list of phones, finds the end node in the trie associated with those phones.
         Returns a RhymeTrieNode or False if there is no end node associated with the given phones'''
-        if phones:
-            child_node = self.children.get(phones[0])
-            if child_node:
-                return child_node.search(phones[1:])
-        elif self.words:
-            return self
+        node = self.search(phones)
+        if node and node.words:
+            return node
         return False
 
     def search(self, phones):
         '''Given a list of phones, find a node in the trie associated with those phones.
         Returns a RhymeTrieNode or None if there is no node associated with the given phones'''
-        if not phones:
-            return self
-        child_node = self.children.get(phones[0])
-        if child_node:
-            return child_node.search(phones[1:])
-        return None
-
-    def search_permutations(self, phones):
-        '''Returns a generator of nodes'''
-        if not phones:
-            yield self
-            return
-        yield from self._add_subtract_phones(phones)
-        permuted_phones = self._get_permuted_phones(phones[0])
-        remaining_phones = phones[1:]
-        for phone in permuted_phones:
-            child = self.children.get(phone)
-            if child:
-                yield from child.search_permutations(remaining_phones)
+        node = self
+        for phone in phones:
+            node = node.get_child(phone)
+            if not node:
+                return None
+        return node
+
+    def search_permutations(self, phones, stats=None, budget=None,
+                            syllables=None):
+        '''Returns a generator of the distinct nodes matching a list of
+        (permuted) phones'''
+        return self.search_patterns(merge_patterns([phones]), stats, budget,
+                                    syllables)
+
+    def search_patterns(self, pattern_trie, stats=None, budget=None,
+                        syllables=None):
+        '''Returns a generator of the distinct nodes matching any pattern of
+        a rhymeUtils.PatternTrie: the nodes of the accepting states of
+        walk_patterns. Once exhausted, adds the states and nodes it visited
+        to the counters of stats, a QueryStats, if given. Stops early, with
+        the nodes found so far, when budget, a QueryBudget, runs out. With
+        syllables, skips the subtrees without words of that many
+        syllables'''
+        accepting = pattern_trie.accepting
+        for node, position in self.walk_patterns(pattern_trie, 0, stats,
+                                                 budget, syllables):
+            if accepting[position]:
+                yield node
+
+    def walk_patterns(self, pattern_trie, position=0, stats=None,
+                      budget=None, syllables=None):
+        '''Returns a generator of every (node, pattern position) state of a
+        search for the patterns of a rhymeUtils.PatternTrie started from
+        this node at a pattern position, matching or not, so that callers
+        can resume a search elsewhere, eg phrase search at the end of a
+        word. Accepting states are not walked past. Walks an explicit stack
+        of states, each visited at most once: additive and subtractive
+        phones, and patterns sharing a tail, reach the same states along
+        many paths. stats, budget and syllables are as for
+        search_patterns'''
+        steps, accepting = pattern_trie
+        additive = [bool(position_steps) and
+                    position_steps[0][1] is Permutations.ADDITIVE
+                    for position_steps in steps]
+        consonants = get_phone_mask(get_consonants())
+        stack = [(self, position)]
+        seen = set(stack)
+        while stack:
+            if budget is not None and budget.visit(len(seen)):
+                break
+            node, position = stack.pop()
+            yield node, position
+            if accepting[position]:
+                continue
+            for _, permutation, next_position in steps[position]:
+                if permutation is Permutations.SUBTRACTIVE:
+                    # try all permutations without this phone
+                    state = (node, next_position)
+                    if state not in seen:
+                        seen.add(state)
+                        stack.append(state)
+            if additive[position]:
+                # try all permutations with an added consonant
+                for child in node.get_masked_children(consonants):
+                    if (syllables is not None and
+                            not child.has_syllables(syllables)):
+                        continue
+                    state = (child, position)
+                    if state not in seen:
+                        seen.add(state)
+                        stack.append(state)
+            for candidates, _, next_position in steps[position]:
+                for child in node.get_masked_children(candidates):
+                    if (syllables is not None and
+                            not child.has_syllables(syllables)):
+                        continue
+                    state = (child, next_position)
+                    if state not in seen:
+                        seen.add(state)
+                        stack.append(state)
+        if stats is not None:
+            stats.count('states', len(seen))
+            stats.count('nodes', len({node for node, _ in seen}))
+
+    def search_permutation_roots(self, phones, stats=None, budget=None,
+                                 syllables=None):
+        '''Returns a list of the nodes matching a list of (permuted) phones
+        that are not under another matching node. Their subtrees are
+        disjoint and hold every matching word exactly once.'''
+        return self.search_pattern_roots(merge_patterns([phones]), stats,
+                                         budget, syllables)
+
+    def search_pattern_roots(self, pattern_trie, stats=None, budget=None,
+                             syllables=None):
+        '''Like search_permutation_roots, for the patterns of a
+        rhymeUtils.PatternTrie'''
+        nodes = list(self.search_patterns(pattern_trie, stats, budget,
+                                          syllables))
+        node_set = set(nodes)
+        roots = []
+        for node in nodes:
+            ancestor = node.parent
+            while ancestor is not None and ancestor not in node_set:
+                ancestor = ancestor.parent
+            if ancestor is None:
+                roots.append(node)
+        if stats is not None:
+            stats.count('matches', len(nodes))
+            stats.count('roots', len(roots))
+        return roots
 
     def assemble(self):
         '''Aggregate all phones up the trie from this node, inclusive. Returns a generator'''
-        if self.phone:
-            yield self.phone
-            yield from self.parent.assemble()
+        node = self
+        while node.phone:
+            yield node.phone
+            node = node.parent
 
     def count_nodes(self):
         '''Counts the number of nodes in the trie'''
@@ -70,27 +242,31 @@ class RhymeTrieNode(object):
         '''Counts the number of words in the trie'''
         return len(self.words) + sum(child.count_words() for child in self.children.values())
 
-    def get_sub_words(self):
-        yield from self.words
-        for child in self.children.values():
-            yield from child.get_sub_words()
-
-    def _get_permuted_phones(self, phone):
-        if isinstance(phone, PermutedPhone):
-            getter = permutation_getters.get(phone.permutation)
-            yield from getter(phone.phone)
-        else:
-            yield phone
-
-    def _add_subtract_phones(self, phones):
-        if isinstance(phones[0], PermutedPhone):
-            phone = phones[0]
-            # try all permutations without this phone
-            if phone.permutation == Permutations.SUBTRACTIVE:
-                yield from self.search_permutations(phones[1:])
-            elif phone.permutation == Permutations.ADDITIVE:
-                for consonant in CONSONANTS:
-                    # try all permutations with this added consonant
-                    child = self.children.get(consonant)
-                    if child:
-                        yield from child.search_permutations(phones)
+    def count_sub_words(self):
+        '''Counts the words under this node, inclusive'''
+        count = 0
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            count += len(node.words)
+            stack.extend(node.children.values())
+        return count
+
+    def get_sub_words(self, syllables=None):
+        '''Returns a generator of the words under this node, inclusive, only
+        those of a number of syllables if given'''
+        stack = [self]
+        if syllables is None:
+            while stack:
+                node = stack.pop()
+                yield from node.words
+                stack.extend(node.children.values())
+            return
+        while stack:
+            node = stack.pop()
+            if not node.has_syllables(syllables):
+                continue
+            # a node's own words have the fewest syllables of its subtree
+            if node.min_syllables == syllables:
+                yield from node.words
+            stack.extend(node.children.values())
@@ -0,0 +1,165 @@
+'''Song stats ranks as flat integer arrays, for sorting rhymes without
+building string sort keys'''
+from array import array
+from bisect import bisect_left
+from .IOUtil import map_sections, write_sections
+
+MAGIC = b'PHYMSONG'
+VERSION = 1
+NO_RANK = 0xFFFFFFFF
+
+# (name, array typecode) of each section, in file order
+SECTIONS = (
+    ('count_ranks', 'I'),
+    ('pair_start', 'I'),
+    ('pair_ids', 'I'),
+    ('word_blob', 'B'),
+)
+
+
+def unranked_key(word):
+    '''Sort key of words without a rank: the word without apostrophes, then
+    the word, so that words equal without apostrophes keep one order'''
+    return word.replace("'", ''), word
+
+
+class SongRanking(object):
+    '''The song stats ranks of words:
+
+    words       -- per word id, the word. Ids number the words in
+                   unranked_key order
+    count_ranks -- per word id, its frequency rank (NO_RANK if it has none)
+    pair_start  -- per word id, offset of its first pair (CSR, n_words + 1)
+    pair_ids    -- per word, ids of the words it is most often rhymed with,
+                   best first
+
+    Words sort by pair rank for the input word, else by count rank, both
+    compared as numbers, then by id. Words with neither come after, in
+    unranked_key order. Arrays may be array.array objects or memoryviews
+    over a memory-mapped file.'''
+
+    def __init__(self, words, count_ranks, pair_start, pair_ids, buffer=None):
+        self.words = words
+        self.word_ids = {word: i for i, word in enumerate(words)}
+        self.count_ranks = count_ranks
+        self.pair_start = pair_start
+        self.pair_ids = pair_ids
+        # keep the mmap alive for as long as the views into it are
+        self._buffer = buffer
+
+    def __len__(self):
+        return len(self.words)
+
+    def get_count_rank(self, word):
+        '''Returns the frequency rank of a word, or None'''
+        word_id = self.word_ids.get(word)
+        if word_id is None or self.count_ranks[word_id] == NO_RANK:
+            return None
+        return self.count_ranks[word_id]
+
+    def get_pair_ranks(self, word):
+        '''Returns a dict of word id -> rank of the words a word is most often
+        rhymed with, 0 for the most'''
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            return dict()
+        pair_ids = self.pair_ids[self.pair_start[word_id]:
+                                 self.pair_start[word_id + 1]]
+        return {pair_id: rank for rank, pair_id in enumerate(pair_ids)}
+
+    def sort(self, words, pair_ranks):
+        '''Sort words given the pair ranks of the input word.
+        Returns a list of words'''
+        word_ids = self.word_ids
+        count_ranks = self.count_ranks
+        # rank and id in one int, so ranked words sort on plain ints
+        stride = len(self.words)
+        ranked = []
+        unranked = []
+        for word in words:
+            word_id = word_ids.get(word)
+            if word_id is None:
+                unranked.append(word)
+                continue
+            rank = pair_ranks.get(word_id)
+            if rank is None:
+                rank = count_ranks[word_id]
+                if rank == NO_RANK:
+                    unranked.append(word)
+                    continue
+            ranked.append((rank * stride + word_id, word))
+        ranked.sort()
+        unranked.sort(key=unranked_key)
+        return [word for _, word in ranked] + unranked
+
+    def resort(self, words, pair_ranks):
+        '''Sort words already in sort() order for no pair ranks, given the
+        pair ranks of the input word. Only the paired words move, so this
+        takes a pass over the words instead of a sort.
+        Returns a list of words'''
+        if not pair_ranks:
+            return list(words)
+        stride = len(self.words)
+        keys = {self.words[pair_id]: rank * stride + pair_id
+                for pair_id, rank in pair_ranks.items()}
+        paired = keys.keys() & words
+        if not paired:
+            return list(words)
+        word_ids = self.word_ids
+        count_ranks = self.count_ranks
+        rest = [word for word in words if word not in paired]
+        # keys of the ranked words, which come first: paired words are all
+        # ranked, so they go before the unranked
+        rest_keys = []
+        for word in rest:
+            word_id = word_ids.get(word)
+            if word_id is None or count_ranks[word_id] == NO_RANK:
+                break
+            rest_keys.append(count_ranks[word_id] * stride + word_id)
+        result = []
+        start = 0
+        for word in sorted(paired, key=keys.__getitem__):
+            end = bisect_left(rest_keys, keys[word], start)
+            result.extend(rest[start:end])
+            result.append(word)
+            start = end
+        result.extend(rest[start:])
+        return result
+
+    @classmethod
+    def build(cls, word_keys, keyed_counts, keyed_pairs):
+        '''Build the ranks from the song stats dicts of word -> short key,
+        key -> count rank and key -> keys of paired words, worst first'''
+        key_words = {key: word for word, key in word_keys.items()}
+        words = sorted(word_keys, key=unranked_key)
+        word_ids = {word: i for i, word in enumerate(words)}
+        count_ranks = array('I', [NO_RANK]) * len(words)
+        for key, rank in keyed_counts.items():
+            word = key_words.get(key)
+            if word is not None:
+                count_ranks[word_ids[word]] = rank
+        pair_start = array('I', [0])
+        pair_ids = array('I')
+        for word in words:
+            paired_keys = keyed_pairs.get(word_keys[word], [])
+            pair_ids.extend(word_ids[key_words[key]]
+                            for key in reversed(paired_keys))
+            pair_start.append(len(pair_ids))
+        return cls(words, count_ranks, pair_start, pair_ids)
+
+    def save(self, path):
+        '''Write the ranks to a binary file'''
+        write_sections(path, MAGIC, VERSION, SECTIONS, {
+            'count_ranks': self.count_ranks,
+            'pair_start': self.pair_start,
+            'pair_ids': self.pair_ids,
+            'word_blob': '\n'.join(self.words).encode('utf-8')})
+
+    @classmethod
+    def load(cls, path):
+        '''Memory-map a file written by save(). Pair lists are zero-copy
+        slices of the file'''
+        sections, buffer = map_sections(path, MAGIC, VERSION, SECTIONS)
+        words = bytes(sections['word_blob']).decode('utf-8').split('\n')
+        return cls(words, sections['count_ranks'], sections['pair_start'],
+                   sections['pair_ids'], buffer)
@@ -0,0 +1,177 @@
+'''phyme: stream rhymes of words read from files or stdin as JSON Lines.
+
+    phyme --types perfect,family words.txt > rhymes.jsonl
+    cat words.txt | phyme --workers 4 --unordered
+    phyme --types assonance --num-syllables 2 --syllables 3 words.txt
+
+Each input line is a word. Each output line is
+{"word": ..., "rhymes": {rhyme type: {syllables: [words]}}}, or
+{"word": ..., "error": ...} for words not in the dictionary. Words are read
+and looked up in chunks, with a bounded number of chunks in flight, so
+memory stays flat however long the input is.'''
+import argparse
+import fileinput
+import json
+import sys
+import warnings
+from collections import deque
+from concurrent.futures import (ProcessPoolExecutor, FIRST_COMPLETED,
+                                wait)
+from itertools import islice
+from . import rhymeUtils as ru
+from .Phyme import Phyme
+
+_worker = None
+
+
+def _init_worker(engine):
+    global _worker
+    _worker = Phyme(engine)
+
+
+def _filtered_rhymes(words, types, num_syllables, syllables, stresses):
+    '''Rhymes of words as batch_rhymes returns them, keeping only the
+    rhymes of a number of syllables or vowel stresses'''
+    results = {}
+    for word in words:
+        try:
+            results[word] = {rhyme_type: _worker.get_rhymes(
+                word, rhyme_type, num_syllables, syllables=syllables,
+                stresses=stresses) for rhyme_type in types}
+        except KeyError:
+            results[word] = None
+    return results
+
+
+def _lookup_chunk(words, types, num_syllables, syllables=None,
+                  stresses=None):
+    '''Look up a chunk of words in this process's Phyme.
+    Returns the output lines'''
+    if syllables is None and stresses is None:
+        results = _worker.batch_rhymes(words, types, num_syllables)
+    else:
+        results = _filtered_rhymes(words, types, num_syllables, syllables,
+                                   stresses)
+    lines = []
+    for word in words:
+        result = results[word]
+        if result is None:
+            line = {'word': word, 'error': 'not in dictionary'}
+        else:
+            line = {'word': word, 'rhymes': {
+                rhyme_type: {str(k): list(v) for k, v in rhymes.items()}
+                for rhyme_type, rhymes in result.items()}}
+        lines.append(json.dumps(line))
+    return lines
+
+
+def iter_chunks(lines, size):
+    '''Generate lists of up to size words from lines, skipping blanks'''
+    words = (line.strip() for line in lines)
+    words = (word for word in words if word)
+    while True:
+        chunk = list(islice(words, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def lookup(chunks, types, num_syllables=None, engine='flat', workers=1,
+           ordered=True, syllables=None, stresses=None):
+    '''Look up chunks of words, in a pool of worker processes if workers is
+    more than 1. At most two chunks per worker are in flight at a time.
+    syllables and stresses keep only the rhymes of that many syllables or
+    those vowel stresses, as for the get_*_rhymes methods.
+    Returns a generator of output lines, in input order unless ordered is
+    False'''
+    global _worker
+    if _worker is None or _worker.engine != engine:
+        # loading before forking lets the workers share the data
+        _init_worker(engine)
+    if workers <= 1:
+        for chunk in chunks:
+            yield from _lookup_chunk(chunk, types, num_syllables, syllables,
+                                     stresses)
+        return
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(engine,)) as pool:
+        pending = deque()
+
+        def finish():
+            if ordered:
+                return pending.popleft().result()
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            lines = []
+            for future in done:
+                pending.remove(future)
+                lines.extend(future.result())
+            return lines
+
+        for chunk in chunks:
+            pending.append(pool.submit(_lookup_chunk, chunk, types,
+                                       num_syllables, syllables, stresses))
+            if len(pending) >= workers * 2:
+                yield from finish()
+        while pending:
+            yield from finish()
+
+
+def main(argv=None, stdout=None):
+    parser = argparse.ArgumentParser(
+        prog='phyme', description='Stream rhymes of words as JSON Lines')
+    parser.add_argument('files', nargs='*', metavar='FILE',
+                        help='files of one word per line (default: stdin)')
+    parser.add_argument('-t', '--types', default=','.join(ru.RHYME_TYPES),
+                        help='comma separated rhyme types (default: all)')
+    parser.add_argument('-n', '--num-syllables', type=int, default=None,
+                        help='number of syllables to rhyme')
+    # -s was short for --syllables, which set num_syllables before the
+    # syllables filter took the name
+    parser.add_argument('-s', type=int, default=None, dest='old_syllables',
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--syllables', type=int, default=None,
+                        help='keep only rhymes of this many syllables')
+    parser.add_argument('--stresses', default=None,
+                        help='keep only rhymes with these vowel stresses, '
+                             'eg 10')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='worker processes (default: 1)')
+    parser.add_argument('--unordered', action='store_true',
+                        help='write results as they finish instead of in '
+                             'input order')
+    parser.add_argument('--chunk-size', type=int, default=256,
+                        help='words per unit of work (default: 256)')
+    parser.add_argument('--engine', default='flat', choices=('flat', 'node'))
+    args = parser.parse_args(argv)
+    types = [t.strip() for t in args.types.split(',') if t.strip()]
+    unknown = [t for t in types if t not in ru.RHYME_TYPES]
+    if unknown:
+        parser.error('unknown rhyme types: ' + ', '.join(unknown))
+    if args.chunk_size < 1:
+        parser.error('--chunk-size must be at least 1')
+    if args.old_syllables is not None:
+        warnings.warn('-s is deprecated, use -n/--num-syllables',
+                      FutureWarning)
+        if args.num_syllables is None:
+            args.num_syllables = args.old_syllables
+    try:
+        ru.make_word_filter(args.syllables, args.stresses)
+    except ValueError as e:
+        parser.error(str(e))
+    stdout = stdout or sys.stdout
+    try:
+        with fileinput.input(args.files or ('-',)) as lines:
+            chunks = iter_chunks(lines, args.chunk_size)
+            for line in lookup(chunks, types, args.num_syllables,
+                               args.engine, args.workers, not args.unordered,
+                               args.syllables, args.stresses):
+                stdout.write(line + '\n')
+        stdout.flush()
+    except BrokenPipeError:
+        # the reader went away, eg piped into head
+        sys.stderr.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
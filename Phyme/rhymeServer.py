@@ -0,0 +1,408 @@
+'''Local HTTP/JSON rhyme server. The parent process loads the rhyme data once
+and then forks workers that share it copy-on-write and accept connections on
+one listening socket.
+
+    python -m Phyme.rhymeServer --port 8765 --workers 4
+    python -m Phyme.rhymeServer --unix-socket /tmp/phyme.sock
+
+Endpoints:
+    GET  /rhymes?word=dog&type=perfect[&num_syllables=2]
+    POST /batch      {"words": [...], "types": [...], "num_syllables": 2}
+    GET  /health
+    GET  /metrics
+
+Rhymes are returned as objects of syllables -> words. With --max-nodes,
+--max-results or --timeout, each /rhymes query and each word and type of a
+/batch gets a QueryBudget, and the "truncated" of a /rhymes response names
+the limit that cut its rhymes short, if any. Errors are returned as
+{"error": message} with status 400 for bad requests and 404 for words not
+in the dictionary.'''
+import argparse
+import gc
+import http.client
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from multiprocessing import RawArray
+from urllib.parse import parse_qs, urlencode, urlparse
+from . import rhymeUtils as ru
+from .Phyme import Phyme
+from .QueryBudget import QueryBudget
+
+# per worker slot counters in shared memory
+METRICS = ('requests', 'errors', 'seconds')
+
+
+class RequestError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _to_json(rhymes):
+    '''Rhymes as returned by Phyme, with syllables as string keys'''
+    if rhymes is None:
+        return None
+    return {str(syllables): list(words) for syllables, words in rhymes.items()}
+
+
+def _parse_num_syllables(value):
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RequestError(400, 'num_syllables must be an integer')
+
+
+class RhymeRequestHandler(BaseHTTPRequestHandler):
+    '''Routes requests to the server's Phyme'''
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self._handle(url.path, lambda: self._route_get(url.path, query))
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        self._handle(path, lambda: self._route_post(path))
+
+    def _route_get(self, path, query):
+        server = self.server
+        if path == '/rhymes':
+            word = query.get('word')
+            rhyme_type = query.get('type', 'perfect')
+            if not word:
+                raise RequestError(400, 'missing word')
+            if rhyme_type not in ru.RHYME_TYPES:
+                raise RequestError(400, 'unknown rhyme type: ' + rhyme_type)
+            num_syllables = _parse_num_syllables(query.get('num_syllables'))
+            budget = server.make_budget()
+            try:
+                rhymes = server.phyme.get_rhymes(word, rhyme_type,
+                                                 num_syllables, budget)
+            except KeyError:
+                raise RequestError(404, 'word not in dictionary: ' + word)
+            return {'word': word, 'type': rhyme_type,
+                    'num_syllables': num_syllables,
+                    'rhymes': _to_json(rhymes),
+                    'truncated': budget and budget.truncated}
+        if path == '/health':
+            return {'status': 'ok', 'pid': os.getpid(),
+                    'engine': server.phyme.engine}
+        if path == '/metrics':
+            return server.get_metrics()
+        raise RequestError(404, 'no such endpoint: ' + path)
+
+    def _route_post(self, path):
+        if path != '/batch':
+            raise RequestError(404, 'no such endpoint: ' + path)
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length).decode('utf-8'))
+            words = body['words']
+        except (ValueError, KeyError, TypeError):
+            raise RequestError(400, 'expected a JSON object with words')
+        if not isinstance(words, list) or not all(
+                isinstance(word, str) for word in words):
+            raise RequestError(400, 'words must be a list of strings')
+        types = body.get('types', ru.RHYME_TYPES)
+        if not isinstance(types, (list, tuple)) or not all(
+                isinstance(rhyme_type, str) for rhyme_type in types):
+            raise RequestError(400, 'types must be a list of strings')
+        unknown = [t for t in types if t not in ru.RHYME_TYPES]
+        if unknown:
+            raise RequestError(400, 'unknown rhyme types: ' +
+                               ', '.join(map(str, unknown)))
+        num_syllables = _parse_num_syllables(body.get('num_syllables'))
+        results = self.server.batch_rhymes(words, types, num_syllables)
+        return {word: None if result is None else
+                {rhyme_type: _to_json(rhymes)
+                 for rhyme_type, rhymes in result.items()}
+                for word, result in results.items()}
+
+    def _handle(self, path, route):
+        start = time.perf_counter()
+        try:
+            status, body = 200, route()
+        except RequestError as e:
+            status, body = e.status, {'error': str(e)}
+        except Exception as e:
+            status, body = 500, {'error': repr(e)}
+        self.server.record(status != 200, time.perf_counter() - start)
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class _RhymeServerMixin(object):
+    '''State shared by the TCP and Unix socket servers'''
+
+    def setup_rhymes(self, phyme, workers=1, verbose=False, limits=None):
+        self.phyme = phyme
+        self.verbose = verbose
+        # QueryBudget arguments of every /rhymes query and /batch item
+        self.limits = limits
+        self.started = time.time()
+        self.slot = 0
+        self.pids = RawArray('q', workers)
+        self.metrics = RawArray('d', workers * len(METRICS))
+
+    def make_budget(self):
+        '''Returns a new QueryBudget of the server's limits, or None'''
+        return QueryBudget(**self.limits) if self.limits else None
+
+    def batch_rhymes(self, words, types, num_syllables=None):
+        '''Rhymes of many words, as Phyme.batch_rhymes. With limits, each word
+        and type is searched on its own with a budget instead'''
+        if not self.limits:
+            return self.phyme.batch_rhymes(words, types, num_syllables)
+        results = {}
+        for word in words:
+            if word in results:
+                continue
+            try:
+                results[word] = {
+                    rhyme_type: self.phyme.get_rhymes(
+                        word, rhyme_type, num_syllables, self.make_budget())
+                    for rhyme_type in types}
+            except KeyError:
+                results[word] = None
+        return results
+
+    def record(self, error, seconds):
+        '''Count a request in this worker's slot. Only this worker writes
+        to it, so no lock is needed'''
+        base = self.slot * len(METRICS)
+        self.metrics[base] += 1
+        self.metrics[base + 1] += error
+        self.metrics[base + 2] += seconds
+
+    def get_metrics(self):
+        '''Returns the counters of every worker and their totals'''
+        workers = []
+        for slot, pid in enumerate(self.pids):
+            requests, errors, seconds = self.metrics[
+                slot * len(METRICS):(slot + 1) * len(METRICS)]
+            workers.append({'pid': pid, 'requests': int(requests),
+                            'errors': int(errors), 'seconds': seconds})
+        totals = {name: sum(worker[name] for worker in workers)
+                  for name in METRICS}
+        totals.update(workers=workers, uptime=time.time() - self.started,
+                      engine=self.phyme.engine,
+                      cache=self.phyme.cache_stats()._asdict()
+                      if self.phyme.cache is not None else None)
+        return totals
+
+
+class RhymeHTTPServer(_RhymeServerMixin, HTTPServer):
+    pass
+
+
+class UnixRhymeHTTPServer(_RhymeServerMixin, socketserver.UnixStreamServer):
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def make_server(phyme, host='127.0.0.1', port=8765, unix_socket=None,
+                workers=1, verbose=False, limits=None):
+    '''Create a bound and listening rhyme server. limits is a dict of
+    QueryBudget arguments for each /rhymes query and /batch item, or None
+    for no limits'''
+    if unix_socket is not None:
+        server = UnixRhymeHTTPServer(unix_socket, RhymeRequestHandler)
+    else:
+        server = RhymeHTTPServer((host, port), RhymeRequestHandler)
+    server.setup_rhymes(phyme, workers, verbose, limits)
+    return server
+
+
+def warm_up(phyme):
+    '''Load every dataset queries use, so forked workers share them'''
+    for rhyme_type in ru.RHYME_TYPES:
+        phyme.get_rhymes('dog', rhyme_type)
+    list(phyme.iter_rhymes('dog', 'perfect', limit=1))
+
+
+def serve(phyme, workers=1, **kwargs):
+    '''Serve rhymes until interrupted. With more than one worker, forks that
+    many workers after loading the data and restarts any that die'''
+    warm_up(phyme)
+    if not hasattr(os, 'fork'):
+        workers = 1
+    server = make_server(phyme, workers=workers, **kwargs)
+    if workers <= 1:
+        server.pids[0] = os.getpid()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+    # keep the garbage collector from touching, and so copying, the pages
+    # of the data loaded so far
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+    children = {}
+
+    def spawn(slot):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            server.slot = slot
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        server.pids[slot] = pid
+        children[pid] = slot
+
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for slot in range(workers):
+        spawn(slot)
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is not None and not stopping:
+            spawn(slot)
+    server.server_close()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_socket = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_socket)
+
+
+class RhymeClient(object):
+    '''Minimal client of a rhyme server, over TCP or a Unix socket'''
+
+    def __init__(self, host='127.0.0.1', port=8765, unix_socket=None,
+                 timeout=30):
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.timeout = timeout
+
+    def _request(self, method, path, body=None):
+        if self.unix_socket is not None:
+            connection = _UnixHTTPConnection(self.unix_socket, self.timeout)
+        else:
+            connection = http.client.HTTPConnection(self.host, self.port,
+                                                    timeout=self.timeout)
+        try:
+            headers = {}
+            if body is not None:
+                body = json.dumps(body).encode('utf-8')
+                headers['Content-Type'] = 'application/json'
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            result = json.loads(response.read().decode('utf-8'))
+        finally:
+            connection.close()
+        if response.status != 200:
+            raise RequestError(response.status, result.get('error'))
+        return result
+
+    def get_rhymes(self, word, rhyme_type='perfect', num_syllables=None):
+        '''Returns a dict of syllables (as strings) -> words'''
+        query = {'word': word, 'type': rhyme_type}
+        if num_syllables is not None:
+            query['num_syllables'] = num_syllables
+        return self._request('GET', '/rhymes?' + urlencode(query))['rhymes']
+
+    def batch_rhymes(self, words, types=ru.RHYME_TYPES, num_syllables=None):
+        return self._request('POST', '/batch', {
+            'words': list(words), 'types': list(types),
+            'num_syllables': num_syllables})
+
+    def health(self):
+        return self._request('GET', '/health')
+
+    def metrics(self):
+        return self._request('GET', '/metrics')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve Phyme rhymes as JSON over HTTP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix-socket', help='listen on this socket path '
+                        'instead of TCP')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (default: number of CPUs)')
+    parser.add_argument('--engine', default='flat', choices=('flat', 'node'))
+    parser.add_argument('--cache-size', type=int, default=None,
+                        help='LRU cache size per worker (default: no cache)')
+    parser.add_argument('--verbose', action='store_true',
+                        help='log every request')
+    parser.add_argument('--max-nodes', type=int, default=None,
+                        help='trie states a query may visit')
+    parser.add_argument('--max-results', type=int, default=None,
+                        help='rhymes a query may collect')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='seconds a query may take')
+    args = parser.parse_args(argv)
+    limits = {name: getattr(args, name)
+              for name in ('max_nodes', 'max_results', 'timeout')
+              if getattr(args, name) is not None}
+    phyme = Phyme(args.engine, cache_size=args.cache_size)
+    serve(phyme, workers=args.workers, host=args.host, port=args.port,
+          unix_socket=args.unix_socket, verbose=args.verbose,
+          limits=limits or None)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
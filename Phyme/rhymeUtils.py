@@ -1,15 +1,10 @@
 '''Utils related to rhyming'''
+import re
 import warnings
 from . import IOUtil
-from collections import defaultdict
-from enum import Enum
-
-
-def _auto():
-    count = 0
-    while True:
-        yield count
-        count += 1
+from .util import load_once, flatten
+from collections import defaultdict, namedtuple
+from enum import Enum, auto
 
 
 STRESSED_FLAGS = frozenset(('1', '2'))
@@ -18,10 +13,8 @@ VOICED_CONSONANTS = frozenset(('B', 'D', 'G', 'V', 'DH', 'Z', 'ZH', 'JH', 'M',
 AFFRICATE = 'affricate'
 FRICATIVE = 'fricative'
 VOWEL = 'vowel'
-
-phone_type_dict, type_phone_dict = IOUtil.load_phone_type_dicts()
-word_phone_dict = IOUtil.load_word_phone_dict()
-type_voiced_phone_dict = defaultdict(lambda: defaultdict(set))
+# alternate pronunciations are stored as WORD(1), WORD(2), ...
+PRONUNCIATION_MARKER = re.compile(r'\(\d+\)')
 
 
 class PermutedPhone(object):
@@ -33,15 +26,23 @@ class PermutedPhone(object):
     def __repr__(self):
         return self.phone + ' ' + self.permutation.name
 
+    def __eq__(self, other):
+        return (isinstance(other, PermutedPhone) and
+                other.phone == self.phone and
+                other.permutation == self.permutation)
+
+    def __hash__(self):
+        return hash((self.phone, self.permutation))
+
 
 class Permutations(Enum):
-    ADDITIVE = _auto()
-    SUBTRACTIVE = _auto()
-    PARTNER = _auto()
-    FAMILY = _auto()
-    ASSONANCE = _auto()
-    CONSONANT = _auto()
-    SUBSTITUTION = _auto()
+    ADDITIVE = auto()
+    SUBTRACTIVE = auto()
+    PARTNER = auto()
+    FAMILY = auto()
+    ASSONANCE = auto()
+    CONSONANT = auto()
+    SUBSTITUTION = auto()
 
 
 def is_vowel(phone):
@@ -51,7 +52,7 @@ def is_vowel(phone):
     '''
     if isinstance(phone, PermutedPhone):
         phone = phone.phone
-    return phone_type_dict.get(phone) == VOWEL
+    return phone in get_vowels()
 
 
 def is_consonant(phone):
@@ -62,8 +63,79 @@ def is_consonant(phone):
     return not is_vowel(phone)
 
 
-CONSONANTS = frozenset(x for x in phone_type_dict if is_consonant(x))
-VOWELS = frozenset(x for x in phone_type_dict if is_vowel(x))
+@load_once
+def get_vowels():
+    '''Returns a frozenset of all vowel phones'''
+    phone_type_dict, _ = IOUtil.load_phone_type_dicts()
+    return frozenset(phone for phone, type_ in phone_type_dict.items()
+                     if type_ == VOWEL)
+
+
+@load_once
+def get_consonants():
+    '''Returns a frozenset of all consonant phones'''
+    phone_type_dict, _ = IOUtil.load_phone_type_dicts()
+    return frozenset(phone for phone in phone_type_dict
+                     if is_consonant(phone))
+
+
+@load_once
+def get_phones_by_id():
+    '''Returns a tuple of every phone, including stress variants, indexed by
+    a small integer id'''
+    phone_type_dict, _ = IOUtil.load_phone_type_dicts()
+    return tuple(sorted(phone_type_dict))
+
+
+@load_once
+def get_phone_ids():
+    '''Returns a dict of phone -> integer id'''
+    return {phone: i for i, phone in enumerate(get_phones_by_id())}
+
+
+def get_phone_mask(phones):
+    '''Returns an int with the bit of each phone's id set'''
+    phone_ids = get_phone_ids()
+    mask = 0
+    for phone in phones:
+        mask |= 1 << phone_ids[phone]
+    return mask
+
+
+def _count_bits(mask):
+    return bin(mask).count('1')
+
+
+# number of bits set in an int: int.bit_count is Python 3.10+
+count_bits = getattr(int, 'bit_count', _count_bits)
+
+
+def iter_mask_ids(mask):
+    '''Returns a generator of the phone ids set in a mask, lowest first'''
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+@load_once
+def load_phone_class_masks():
+    '''Precompute the phones each phone may match, alone and under every
+    permutation, as masks over phone ids.
+    Returns a dict of phone or PermutedPhone -> int'''
+    masks = {}
+    for phone in get_phones_by_id():
+        masks[phone] = get_phone_mask((phone,))
+        for permutation, getter in permutation_getters.items():
+            masks[PermutedPhone(phone, permutation)] = get_phone_mask(
+                getter(phone))
+    return masks
+
+
+def get_phone_class_mask(phone):
+    '''Returns the mask of the phones a (permuted) phone may match, 0 for
+    unknown phones'''
+    return load_phone_class_masks().get(phone, 0)
 
 
 def is_voiced(phone):
@@ -92,9 +164,107 @@ def extract_syllables(phones):
     return syllables
 
 
+# syllables -- number of syllables
+# stresses -- stress digit of each syllable's vowel, eg '102'
+# last_stressed -- index of the first phone of the default rhyme (the vowel
+#     of the last stressed syllable, or of the syllable before a trailing
+#     unstressed one), or None if the word has no vowel
+WordInfo = namedtuple('WordInfo', ['syllables', 'stresses', 'last_stressed'])
+
+
+def make_word_info(phones):
+    '''Compute the WordInfo of a list of phones'''
+    vowels = get_vowels()
+    positions = [i for i, phone in enumerate(phones) if phone in vowels]
+    stresses = ''.join(phones[i][-1] for i in positions)
+    if not positions:
+        last_stressed = None
+    elif len(positions) == 1 or stresses[-1] in STRESSED_FLAGS:
+        last_stressed = positions[-1]
+    else:
+        last_stressed = positions[-2]
+    return WordInfo(max(len(positions), 1), stresses, last_stressed)
+
+
+def group_word_info(word_info):
+    '''Group a dict of word -> WordInfo into a compact, JSON-friendly list of
+    [syllables, stresses, last_stressed, [words]] records'''
+    groups = defaultdict(list)
+    for word, info in word_info.items():
+        groups[info].append(word)
+    return [list(info) + [sorted(words)] for info, words in
+            sorted(groups.items(), key=lambda item: (item[0].syllables,
+                                                     item[0].stresses,
+                                                     item[0].last_stressed
+                                                     or 0))]
+
+
+@load_once
+def load_word_info():
+    '''Load a dict of lowercase word (as stored in the rhyme trie) ->
+    WordInfo for every word in the pronunciation dict, from the prebuilt
+    table if there is one'''
+    records = IOUtil.load_word_info_records()
+    if records is None:
+        word_info = {}
+        for word, phones in IOUtil.load_word_phone_dict().items():
+            word_info[word.lower()] = make_word_info(phones)
+        records = group_word_info(word_info)
+    word_info = {}
+    for syllables, stresses, last_stressed, words in records:
+        # words with the same info share one WordInfo
+        word_info.update(dict.fromkeys(
+            words, WordInfo(syllables, stresses, last_stressed)))
+    return word_info
+
+
+def get_word_info(word):
+    '''Get the precomputed WordInfo of a word'''
+    word_info = load_word_info()
+    info = word_info.get(word)
+    if info is None:
+        info = word_info[word.lower()]
+    return info
+
+
 def count_syllables(word):
-    phones = get_phones(word)
-    return len(extract_syllables(phones))
+    return get_word_info(word).syllables
+
+
+# a filter on the rhymes of a query, by their WordInfo:
+# syllables -- number of syllables, or None for any
+# stresses -- stress digits of the syllables' vowels, eg '10', or None for
+#     any. Stresses fix the number of syllables too
+WordFilter = namedtuple('WordFilter', ['syllables', 'stresses'])
+
+
+def make_word_filter(syllables=None, stresses=None):
+    '''Returns a WordFilter, or None if there is nothing to filter.
+    Raises ValueError if syllables and stresses disagree'''
+    if stresses is None:
+        return None if syllables is None else WordFilter(syllables, None)
+    if syllables is not None and syllables != max(len(stresses), 1):
+        raise ValueError('{} syllables do not fit stresses {!r}'.format(
+            syllables, stresses))
+    return WordFilter(max(len(stresses), 1), stresses)
+
+
+def filter_words(words, word_filter):
+    '''Returns a list of the words a WordFilter keeps'''
+    word_info = load_word_info()
+    syllables, stresses = word_filter
+    if stresses is None:
+        return [word for word in words
+                if word_info[word].syllables == syllables]
+    return [word for word in words
+            if word_info[word].stresses == stresses and
+            word_info[word].syllables == syllables]
+
+
+def count_vowels(phones):
+    '''Number of vowels in a list of phones'''
+    vowels = get_vowels()
+    return sum(1 for phone in phones if phone in vowels)
 
 
 def get_last_stressed(syllables):
@@ -128,12 +298,14 @@ def is_stressed(syllable):
 
 def get_consonant_family(consonant):
     '''Given a consonant, get its family (type, voiced) members'''
+    phone_type_dict, _ = IOUtil.load_phone_type_dicts()
     family = phone_type_dict[consonant]
-    return type_voiced_phone_dict[family][is_voiced(consonant)]
+    return load_type_voiced_phone_dict()[family][is_voiced(consonant)]
 
 
 def get_consonant_partners(consonant):
     '''Given a consonant, get its type members'''
+    phone_type_dict, type_phone_dict = IOUtil.load_phone_type_dicts()
     family = phone_type_dict[consonant]
     return type_phone_dict[family]
 
@@ -141,7 +313,12 @@ def get_consonant_partners(consonant):
 def get_last_syllables(word, num_sylls=None):
     # TODO: care about stresses?
     word = word.upper()
-    phones = word_phone_dict[word]
+    phones = IOUtil.load_word_phone_dict()[word]
+    if num_sylls is None:
+        last_stressed = get_word_info(word).last_stressed
+        if last_stressed is not None:
+            # only the rhyming tail needs splitting into syllables
+            return extract_syllables(phones[last_stressed:])
     syllables = extract_syllables(phones)
     if num_sylls is None:
         syllables = get_last_stressed(syllables)
@@ -157,17 +334,67 @@ def strip_leading_consonants(phones):
             return phones[i:]
 
 
+def strip_pronunciation_marker(word):
+    '''Returns the canonical spelling of a pronunciation key (BOG(1) -> BOG)'''
+    return PRONUNCIATION_MARKER.sub('', word)
+
+
+def make_word_variants(words):
+    '''Map each word with more than one pronunciation to its pronunciation
+    keys, the bare word first (eg bog -> [bog, bog(1)])
+    Returns a dict of word -> list of keys'''
+    variants = defaultdict(list)
+    for word in words:
+        variants[strip_pronunciation_marker(word)].append(word)
+    return {word: sorted(keys, key=lambda key: (len(key), key))
+            for word, keys in variants.items() if len(keys) > 1}
+
+
+@load_once
+def load_word_variants():
+    '''Load a dict of lowercase word -> lowercase keys of its pronunciations,
+    for the words with more than one, from the prebuilt table if there is
+    one'''
+    variants = IOUtil.load_word_variant_records()
+    if variants is None:
+        variants = make_word_variants(
+            word.lower() for word in IOUtil.load_word_phone_dict())
+    return variants
+
+
+def get_word_variants(word):
+    '''Get the keys of every pronunciation of a word, given any of them.
+    Raises KeyError for words not in the dictionary'''
+    word = strip_pronunciation_marker(word.lower())
+    variants = load_word_variants().get(word)
+    if variants is not None:
+        return variants
+    get_phones(word)
+    return [word]
+
+
 def get_phones(word):
-    return word_phone_dict[word.upper()]
+    return IOUtil.load_word_phone_dict()[word.upper()]
+
+
+def get_word_phones(word):
+    '''Like get_phones, but returns None for words not in the dictionary'''
+    return IOUtil.load_word_phone_dict().get(word.upper())
 
 
 # TODO: move this to IOUtil? But depends on is_voiced fn
-for type_, phones in type_phone_dict.items():
-    for phone in phones:
-        if is_voiced(phone):
-            type_voiced_phone_dict[type_][True].add(phone)
-        else:
-            type_voiced_phone_dict[type_][False].add(phone)
+@load_once
+def load_type_voiced_phone_dict():
+    '''Load a dict of type -> voiced -> set of phones'''
+    _, type_phone_dict = IOUtil.load_phone_type_dicts()
+    type_voiced_phone_dict = defaultdict(lambda: defaultdict(set))
+    for type_, phones in type_phone_dict.items():
+        for phone in phones:
+            if is_voiced(phone):
+                type_voiced_phone_dict[type_][True].add(phone)
+            else:
+                type_voiced_phone_dict[type_][False].add(phone)
+    return type_voiced_phone_dict
 
 permutation_getters = {
     Permutations.ADDITIVE: lambda x: [x],
@@ -175,6 +402,154 @@ permutation_getters = {
     Permutations.PARTNER: get_consonant_partners,
     Permutations.FAMILY: get_consonant_family,
     Permutations.ASSONANCE: lambda x: [x],
-    Permutations.CONSONANT: lambda _: VOWELS,
-    Permutations.SUBSTITUTION: lambda _: CONSONANTS
+    Permutations.CONSONANT: lambda _: get_vowels(),
+    Permutations.SUBSTITUTION: lambda _: get_consonants()
+}
+
+def _permute(phones, permutation, should_permute):
+    return tuple(PermutedPhone(phone, permutation) if should_permute(phone)
+                 else phone for phone in phones)
+
+
+def _ends_in_consonant(syllables):
+    return is_consonant(syllables[0][-1])
+
+
+# rhyme type -> (condition on the rhyming syllables, or None,
+#                function of their flattened phones -> pattern)
+_rhyme_patterns = {
+    'perfect': (None, tuple),
+    'family': (_ends_in_consonant, lambda phones: _permute(
+        phones, Permutations.FAMILY, is_consonant)),
+    'partner': (_ends_in_consonant, lambda phones: _permute(
+        phones, Permutations.PARTNER, is_consonant)),
+    'additive': (None, lambda phones: _permute(
+        phones, Permutations.ADDITIVE, lambda _: True)),
+    'subtractive': (_ends_in_consonant, lambda phones: _permute(
+        phones, Permutations.SUBTRACTIVE, is_consonant)),
+    'consonant': (None, lambda phones: _permute(
+        phones, Permutations.CONSONANT, is_vowel)),
+    'assonance': (None, lambda phones: _permute(
+        filter(is_vowel, phones), Permutations.ADDITIVE, lambda _: True)),
+    'substitution': (None, lambda phones: _permute(
+        phones, Permutations.SUBSTITUTION, is_consonant)),
 }
+RHYME_TYPES = tuple(_rhyme_patterns)
+
+
+def get_rhyme_pattern(word, rhyme_type, num_sylls=None):
+    '''Get the tuple of (permuted) phones that rhymes of a word must end in,
+    in pronunciation order. Words with the same pattern share every rhyme.
+    Returns None if the rhyme type doesn't apply to the word'''
+    try:
+        condition, make_pattern = _rhyme_patterns[rhyme_type]
+    except KeyError:
+        raise ValueError('Unknown rhyme type: {}'.format(rhyme_type))
+    syllables = get_last_syllables(word, num_sylls)
+    if condition is not None and not condition(syllables):
+        return None
+    return make_pattern(flatten(syllables))
+
+
+# reversed rhyme patterns merged into a trie of pattern positions, so the
+# patterns share the search of their common tail. Position 0 is the start.
+#   steps     -- per position, (phone class mask, permutation, next position)
+#                of each (permuted) phone that may come next
+#   accepting -- per position, whether a whole pattern is matched there
+PatternTrie = namedtuple('PatternTrie', ['steps', 'accepting'])
+
+
+def merge_patterns(patterns):
+    '''Merge reversed rhyme patterns into a PatternTrie. A pattern that
+    extends another one matches nothing the other doesn't, so it is dropped.
+    Raises ValueError if additive phones could come next alongside others,
+    which patterns of one rhyme type never do'''
+    children = [{}]
+    accepting = [False]
+    for phones in patterns:
+        position = 0
+        for phone in phones:
+            if accepting[position]:
+                break
+            child = children[position].get(phone)
+            if child is None:
+                child = children[position][phone] = len(children)
+                children.append({})
+                accepting.append(False)
+            position = child
+        else:
+            accepting[position] = True
+            children[position].clear()
+    steps = []
+    for position_children in children:
+        permutations = [phone.permutation
+                        if isinstance(phone, PermutedPhone) else None
+                        for phone in position_children]
+        if (Permutations.ADDITIVE in permutations and
+                set(permutations) != {Permutations.ADDITIVE}):
+            raise ValueError('cannot merge additive and other phones')
+        steps.append(tuple(
+            (get_phone_class_mask(phone), permutation, child)
+            for (phone, child), permutation in zip(
+                position_children.items(), permutations)))
+    return PatternTrie(steps, accepting)
+
+
+def matches_rhyme_pattern(pattern, phones):
+    '''Tests if a pronunciation ends in phones matching a rhyme pattern, the
+    same way searching the rhyme trie for the pattern would find it, but
+    along this one pronunciation only. Fixed-length patterns compare the
+    tails phone by phone; additive and subtractive ones follow the
+    (phone position, pattern position) states of the trie search.'''
+    masks = [get_phone_class_mask(phone) for phone in reversed(pattern)]
+    permutations = [phone.permutation if isinstance(phone, PermutedPhone)
+                    else None for phone in reversed(pattern)]
+    phone_ids = get_phone_ids()
+    ids = [phone_ids.get(phone) for phone in reversed(phones)]
+    if (Permutations.ADDITIVE not in permutations and
+            Permutations.SUBTRACTIVE not in permutations):
+        return len(ids) >= len(masks) and all(
+            phone_id is not None and mask >> phone_id & 1
+            for mask, phone_id in zip(masks, ids))
+    consonants = get_phone_mask(get_consonants())
+    end = len(masks)
+    stack = [(0, 0)]
+    seen = set(stack)
+    while stack:
+        k, i = stack.pop()
+        if i == end:
+            return True
+        next_states = []
+        if permutations[i] is Permutations.SUBTRACTIVE:
+            next_states.append((k, i + 1))
+        if k < len(ids) and ids[k] is not None:
+            if (permutations[i] is Permutations.ADDITIVE and
+                    consonants >> ids[k] & 1):
+                next_states.append((k + 1, i))
+            if masks[i] >> ids[k] & 1:
+                next_states.append((k + 1, i + 1))
+        for state in next_states:
+            if state not in seen:
+                seen.add(state)
+                stack.append(state)
+    return False
+
+
+# datasets that used to be loaded at import time, still available as
+# module attributes but only loaded when first accessed
+_lazy_attributes = {
+    'phone_type_dict': lambda: IOUtil.load_phone_type_dicts()[0],
+    'type_phone_dict': lambda: IOUtil.load_phone_type_dicts()[1],
+    'word_phone_dict': IOUtil.load_word_phone_dict,
+    'type_voiced_phone_dict': load_type_voiced_phone_dict,
+    'VOWELS': get_vowels,
+    'CONSONANTS': get_consonants,
+}
+
+
+def __getattr__(name):
+    loader = _lazy_attributes.get(name)
+    if loader is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(
+            __name__, name))
+    return loader()
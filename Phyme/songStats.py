@@ -1,54 +1,101 @@
+import heapq
 import os
-import json
-import re
+import struct
+import warnings
+from . import IOUtil
+from .rhymeUtils import strip_pronunciation_marker
+from .util import load_once
+from .SongRanking import SongRanking, NO_RANK
 
-file_path = os.path.dirname(__file__)
-with open(os.path.join(file_path, 'data/word_keys.json')) as f:
-    word_keys = json.load(f)
+SONG_RANKING_PATH = os.path.join(IOUtil.file_path, 'data', 'song_ranking.bin')
 
 
-key_words = {v: k for k, v in word_keys.items()}
+@load_once
+def load_key_words():
+    '''Load a dict of short key -> word mappings'''
+    return {v: k for k, v in IOUtil.load_word_keys().items()}
 
-with open(os.path.join(file_path, 'data/keyed_counts.json')) as f:
-    keyed_counts = json.load(f)
 
-with open(os.path.join(file_path, 'data/keyed_pairs.json')) as f:
-    keyed_pairs = json.load(f)
+# datasets that used to be loaded at import time, still available as
+# module attributes but only loaded when first accessed
+_lazy_attributes = {
+    'word_keys': IOUtil.load_word_keys,
+    'key_words': load_key_words,
+    'keyed_counts': IOUtil.load_keyed_counts,
+    'keyed_pairs': IOUtil.load_keyed_pairs,
+}
 
 
-# TODO: regex for different(1) pronunciations
-
-def strip_pronunciation_marker(word):
-    return re.sub(re.compile('\(\d+\)'), '', word)
+def __getattr__(name):
+    loader = _lazy_attributes.get(name)
+    if loader is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(
+            __name__, name))
+    return loader()
 
 
 def get_count_rank(word):
-    return keyed_counts.get(word_keys.get(word))
+    return load_song_ranking().get_count_rank(word)
 
 
 def get_paired_words(word):
-    word_key = word_keys.get(word)
-    if word_key is None:
-        return dict()
-    return {v: k for k, v in enumerate(list(map(lambda key: key_words[key],
-                                                keyed_pairs.get(word_key,
-                                                                [])
-                                                )
-                                            )[::-1]
-                                       )
-            }
-
-
-def _sort_key(word, pair_dict):
-    pair_rank = pair_dict.get(word)
-    if pair_rank is not None:
-        return str(pair_rank)
-    count_rank = get_count_rank(word)
-    if count_rank is not None:
-        return str(count_rank)
-    return re.sub("'", '', word)
+    ranking = load_song_ranking()
+    return {ranking.words[pair_id]: rank
+            for pair_id, rank in ranking.get_pair_ranks(word).items()}
 
 
 def sort_words(inpt, words):
-    pair_dict = get_paired_words(inpt)
-    return sorted(words, key=lambda word: _sort_key(word, pair_dict))
+    ranking = load_song_ranking()
+    return ranking.sort(words, ranking.get_pair_ranks(inpt))
+
+
+@load_once
+def load_song_ranking():
+    '''Load the integer SongRanking of the song stats, memory-mapped from
+    the file written by make_files.py if there is one'''
+    ranking = load_song_ranking_file()
+    if ranking is None:
+        ranking = SongRanking.build(IOUtil.load_word_keys(),
+                                    IOUtil.load_keyed_counts(),
+                                    IOUtil.load_keyed_pairs())
+    return ranking
+
+
+def load_song_ranking_file(path=SONG_RANKING_PATH):
+    '''Memory-map a song ranking file written by make_files.py
+    Returns a SongRanking, or None if there is no usable file'''
+    if not os.path.exists(path):
+        return None
+    try:
+        return SongRanking.load(path)
+    except (ValueError, struct.error) as e:
+        warnings.warn('Ignoring song ranking file: {}'.format(e))
+        return None
+
+
+@load_once
+def load_count_ranked_words():
+    '''Load a list of (count rank, word id, word) of every word with a count
+    rank, in sort_words order'''
+    ranking = load_song_ranking()
+    return sorted((rank, word_id, ranking.words[word_id])
+                  for word_id, rank in enumerate(ranking.count_ranks)
+                  if rank != NO_RANK)
+
+
+def iter_ranked_words(inpt):
+    '''Generate every word that has a pair or count rank for an input word,
+    in sort_words order. Returns a generator of words'''
+    ranking = load_song_ranking()
+    pair_ranks = ranking.get_pair_ranks(inpt)
+    paired = sorted((rank, pair_id, ranking.words[pair_id])
+                    for pair_id, rank in pair_ranks.items())
+    counted = (ranked for ranked in load_count_ranked_words()
+               if ranked[1] not in pair_ranks)
+    for _, _, word in heapq.merge(paired, counted):
+        yield word
+
+
+def is_ranked(word, pair_dict):
+    '''Tests if a word has a pair or count rank'''
+    return word in pair_dict or get_count_rank(word) is not None
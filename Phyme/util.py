@@ -1,7 +1,30 @@
 '''General utils'''
+import threading
+from functools import update_wrapper
 
 
 def flatten(x):
     '''Generator of values from a 2d collection'''
     for y in x:
         yield from y
+
+
+class load_once(object):
+    '''Decorator for a zero-argument loader. The loader runs on the first
+    call only, under a lock so concurrent first calls load the data once,
+    and every later call returns the same object'''
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.value = None
+        update_wrapper(self, loader)
+
+    def __call__(self):
+        if not self.loaded:
+            with self.lock:
+                if not self.loaded:
+                    self.value = self.loader()
+                    self.loaded = True
+        return self.value
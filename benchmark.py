@@ -0,0 +1,263 @@
+'''Benchmarks of Phyme startup, trie builds, memory and rhyme queries.
+
+    python benchmark.py --output results.json
+    python benchmark.py --compare baseline.json
+
+Results are written as JSON of metric name -> {value, unit, better}. With
+--compare, each metric is checked against a saved run and the exit status is
+1 if any got worse by more than the tolerance.'''
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+file_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, file_path)
+
+# fixed corpus: short, long, multi-syllable and out of vocabulary words
+CORPUS = {
+    'short': ['a', 'dog', 'say', 'fire', 'love', 'night', 'cat', 'blue'],
+    'long': ['constantinople', 'antidisestablishmentarianism', 'toxicology',
+             'responsibility', 'extraordinary'],
+    'multi': ['orange', 'master', 'butterfly', 'mississippi', 'together',
+              'remember', 'computer', 'elephant'],
+    'oov': ['asdfghjkl', 'phymeless', 'zzzyzx'],
+}
+RHYME_TYPES = ('perfect', 'family', 'partner', 'additive', 'subtractive',
+               'consonant', 'assonance', 'substitution')
+
+
+def metric(value, unit, better='lower'):
+    return {'value': value, 'unit': unit, 'better': better}
+
+
+def distribution(name, samples, unit='ms', scale=1e3):
+    '''Metrics of the median, 90th and 99th percentile and max of samples'''
+    samples = sorted(samples)
+
+    def percentile(p):
+        return samples[min(len(samples) - 1, int(p * len(samples)))] * scale
+    return {
+        name + '.p50': metric(statistics.median(samples) * scale, unit),
+        name + '.p90': metric(percentile(0.9), unit),
+        name + '.p99': metric(percentile(0.99), unit),
+        name + '.max': metric(samples[-1] * scale, unit),
+    }
+
+
+def run_python(code):
+    '''Run code in a fresh interpreter, returning its stdout'''
+    env = dict(os.environ, PYTHONPATH=file_path)
+    return subprocess.run([sys.executable, '-c', code], env=env, cwd=file_path,
+                          check=True, stdout=subprocess.PIPE,
+                          universal_newlines=True).stdout
+
+
+def bench_startup(repeat):
+    '''Cold import time and time to the first rhyme query of each engine'''
+    results = {}
+    code = ('import time; t = time.perf_counter(); import Phyme; '
+            'print(time.perf_counter() - t)')
+    samples = [float(run_python(code)) for _ in range(repeat)]
+    results['startup.import'] = metric(min(samples) * 1e3, 'ms')
+    for engine in ('flat', 'node'):
+        code = ('import time; t = time.perf_counter(); from Phyme import Phyme; '
+                'Phyme({!r}, use_table=False).get_perfect_rhymes("dog"); '
+                'print(time.perf_counter() - t)').format(engine)
+        samples = [float(run_python(code)) for _ in range(repeat)]
+        results['startup.first_query.' + engine] = metric(
+            min(samples) * 1e3, 'ms')
+    return results
+
+
+def bench_memory():
+    '''Peak resident memory after the first query of each engine'''
+    try:
+        import resource  # noqa: F401
+    except ImportError:
+        return {}
+    results = {}
+    for engine in ('flat', 'node'):
+        code = ('import resource, sys; from Phyme import Phyme; '
+                'Phyme({!r}, use_table=False).get_perfect_rhymes("dog"); '
+                'rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss; '
+                'print(rss if sys.platform == "darwin" else rss * 1024)'
+                ).format(engine)
+        results['memory.peak_rss.' + engine] = metric(
+            int(run_python(code)) / 2 ** 20, 'MB')
+    return results
+
+
+def bench_build(repeat):
+    '''Time to build each trie engine from the word -> phones dict, and to
+    memory-map the snapshot and the rhyme table'''
+    from Phyme.FlatRhymeTrie import FlatRhymeTrie
+    from Phyme.RhymeTrieNode import RhymeTrieNode
+    from Phyme.IOUtil import load_word_phone_dict
+    from Phyme.RhymeTable import RhymeTable
+    from Phyme.Phyme import SNAPSHOT_PATH, RHYME_TABLE_PATH
+    word_phone_dict = load_word_phone_dict()
+    builds = {
+        'build.flat': lambda: FlatRhymeTrie.build(word_phone_dict),
+        'build.node': lambda: RhymeTrieNode.build(
+            (phones[::-1], word) for word, phones in word_phone_dict.items()),
+    }
+    if os.path.exists(SNAPSHOT_PATH):
+        builds['build.snapshot_load'] = lambda: FlatRhymeTrie.load(
+            SNAPSHOT_PATH)
+    if os.path.exists(RHYME_TABLE_PATH):
+        builds['build.table_load'] = lambda: RhymeTable.load(
+            RHYME_TABLE_PATH)
+    results = {}
+    for name, build in builds.items():
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            build()
+            samples.append(time.perf_counter() - start)
+        results[name] = metric(min(samples) * 1e3, 'ms')
+    return results
+
+
+def bench_queries(repeat, engine, use_table=False):
+    '''Latency distribution of each get_*_rhymes method over the corpus,
+    with caching off. With use_table, words in the rhyme table are looked up
+    instead of searched, and the metrics are named query.table'''
+    from Phyme import Phyme
+    rd = Phyme(engine, use_table=use_table)
+    name = 'table' if use_table else engine
+    rd.get_perfect_rhymes('dog')
+    results = {}
+    for rhyme_type in RHYME_TYPES:
+        method = getattr(rd, 'get_{}_rhymes'.format(rhyme_type))
+        for group, words in CORPUS.items():
+            samples = []
+            for _ in range(repeat):
+                for word in words:
+                    start = time.perf_counter()
+                    try:
+                        method(word)
+                    except KeyError:
+                        pass
+                    samples.append(time.perf_counter() - start)
+            results.update(distribution(
+                'query.{}.{}.{}'.format(name, rhyme_type, group), samples))
+    return results
+
+
+def bench_batch(repeat):
+    '''Throughput of batch_rhymes over the whole corpus and every type'''
+    from Phyme import Phyme
+    rd = Phyme(use_table=False)
+    words = [word for group in CORPUS.values() for word in group]
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rd.batch_rhymes(words)
+        samples.append(time.perf_counter() - start)
+    queries = len(words) * len(RHYME_TYPES)
+    return {'batch.throughput': metric(queries / min(samples), 'queries/s',
+                                       better='higher')}
+
+
+def bench_sort_words(repeat):
+    '''Time to rank a large result set'''
+    from Phyme.IOUtil import load_word_phone_dict
+    from Phyme.songStats import sort_words
+    words = sorted(word.lower() for word in load_word_phone_dict())[::5]
+    sort_words('say', words[:1])
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        sort_words('say', words)
+        samples.append(time.perf_counter() - start)
+    return {'sort_words.{}_words'.format(len(words)): metric(
+        min(samples) * 1e3, 'ms')}
+
+
+def run(repeat, engines, quick):
+    from Phyme.Phyme import load_rhyme_table
+    results = {}
+    results.update(bench_startup(repeat))
+    results.update(bench_memory())
+    if not quick:
+        results.update(bench_build(max(1, repeat // 2)))
+    for engine in engines:
+        results.update(bench_queries(repeat, engine))
+    if load_rhyme_table() is not None:
+        results.update(bench_queries(repeat, 'flat', use_table=True))
+    results.update(bench_batch(repeat))
+    results.update(bench_sort_words(repeat))
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'repeat': repeat,
+        },
+        'metrics': results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    '''Print each metric against a baseline run.
+    Returns the names of the metrics that got worse by more than tolerance'''
+    regressions = []
+    for name, current in sorted(results['metrics'].items()):
+        base = baseline['metrics'].get(name)
+        if base is None or not base['value']:
+            print('{:<48} {:>12.3f} {}  (new)'.format(
+                name, current['value'], current['unit']))
+            continue
+        change = current['value'] / base['value'] - 1
+        worse = change if current['better'] == 'lower' else -change
+        flag = ''
+        if worse > tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print('{:<48} {:>12.3f} {:>12.3f} {} {:+7.1%}{}'.format(
+            name, base['value'], current['value'], current['unit'], change,
+            flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help='write results JSON to this file')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='compare against a saved results JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='relative slowdown that counts as a regression '
+                             '(default: 0.2)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='repetitions of each measurement (default: 5)')
+    parser.add_argument('--engine', action='append', choices=('flat', 'node'),
+                        help='trie engines to query (default: flat)')
+    parser.add_argument('--quick', action='store_true',
+                        help='skip the trie build benchmarks')
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat, args.engine or ['flat'], args.quick)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('{} regressions over {:.0%}'.format(len(regressions),
+                                                      args.tolerance))
+            return 1
+    elif not args.output:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
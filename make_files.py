@@ -1,5 +1,5 @@
+import argparse
 import json
-import pickle
 import os
 import sys
 from collections import defaultdict
@@ -86,19 +86,83 @@ def write_dependent_json():
     type_voiced_phone_dict = load_type_voiced_phone_dict()
     with open('Phyme/data/type_voiced_phone.json', 'w') as f:
         json.dump(type_voiced_phone_dict, f)
+    write_word_info()
+    write_word_variants()
 
 
-def write_pickle():
-    rt = load_rhyme_trie()
-    with open('Phyme/data/RhymeTrie.pkl', 'wb') as f:
-        pickle.dump(rt, f)
+def write_word_info():
+    '''Write the syllable and stress metadata of every word'''
+    from Phyme.rhymeUtils import make_word_info, group_word_info
+    word_phone_dict = load_word_phone_dict()
+    word_info = {word.lower(): make_word_info(phones)
+                 for word, phones in word_phone_dict.items()}
+    with open('Phyme/data/word_info.json', 'w') as f:
+        json.dump(group_word_info(word_info), f)
+
 
+def write_word_variants():
+    '''Write the pronunciation keys of every word with more than one'''
+    from Phyme.rhymeUtils import make_word_variants
+    word_phone_dict = load_word_phone_dict()
+    with open('Phyme/data/word_variants.json', 'w') as f:
+        json.dump(make_word_variants(word.lower()
+                                     for word in word_phone_dict), f)
 
-def main():
+
+def write_snapshot():
+    '''Write a memory-mappable binary snapshot of the rhyme trie'''
+    from Phyme.FlatRhymeTrie import FlatRhymeTrie
+    word_phone_dict = load_word_phone_dict()
+    FlatRhymeTrie.build(word_phone_dict).save('Phyme/data/rhyme_trie.bin')
+
+
+def write_rhyme_index():
+    '''Write the memory-mappable assonance and consonant rhyme indexes'''
+    from Phyme.RhymeIndex import RhymeIndex
+    word_phone_dict = load_word_phone_dict()
+    RhymeIndex.build(word_phone_dict).save('Phyme/data/rhyme_index.bin')
+
+
+def write_song_ranking():
+    '''Write a memory-mappable binary file of the song stats ranks'''
+    from Phyme.IOUtil import (load_word_keys, load_keyed_counts,
+                              load_keyed_pairs)
+    from Phyme.SongRanking import SongRanking
+    ranking = SongRanking.build(load_word_keys(), load_keyed_counts(),
+                                load_keyed_pairs())
+    ranking.save('Phyme/data/song_ranking.bin')
+
+
+def write_rhyme_table(cutoff=20000, processes=None):
+    '''Write the memory-mappable table of the rhymes of the cutoff most
+    frequent words in the song stats, computed over a pool of processes
+    (default: one per CPU)'''
+    from Phyme.Phyme import build_rhyme_table
+    from Phyme.songStats import load_count_ranked_words
+    words = [word for _, _, word in load_count_ranked_words()[:cutoff]]
+    table = build_rhyme_table(words, processes or os.cpu_count())
+    table.save('Phyme/data/rhyme_table.bin')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Write the data files of Phyme/data')
+    parser.add_argument('--table-size', type=int, default=20000,
+                        help='most frequent words to precompute rhymes of, '
+                             '0 to skip the rhyme table (default: 20000)')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='processes to build the rhyme table with '
+                             '(default: one per CPU)')
+    args = parser.parse_args(argv)
+    if args.table_size < 0:
+        parser.error('--table-size must be at least 0')
     write_json()
     write_dependent_json()
-    write_pickle()
-
+    write_snapshot()
+    write_rhyme_index()
+    write_song_ranking()
+    if args.table_size:
+        write_rhyme_table(args.table_size, args.processes)
 
 
 if __name__ == '__main__':
@@ -6,6 +6,7 @@ from Phyme import version
 setup(name='Phyme',
       packages=['Phyme'],
       include_package_data=True,
+      entry_points={'console_scripts': ['phyme = Phyme.cli:main']},
       version=version,
       description='Python rhyming dictionary for songwriting',
       author='James Wenzel',
@@ -0,0 +1,128 @@
+import os
+import tempfile
+import unittest
+import sys
+sys.path.append('../')
+from Phyme.FlatRhymeTrie import FlatRhymeTrie, FlatRhymeTrieNode, VERSION
+from Phyme.RhymeTrieNode import RhymeTrieNode
+from Phyme.Phyme import load_rhyme_trie_snapshot
+from Phyme.rhymeUtils import (word_phone_dict, PermutedPhone, Permutations,
+                              load_word_info)
+
+
+class FlatRhymeTrieTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.rt = RhymeTrieNode(None, None)
+        cls.words = sorted(word_phone_dict)[::20] + ['DOG', 'COG', 'LEVEN',
+                                                     'KLEVEN']
+        for word in cls.words:
+            cls.rt.insert(word_phone_dict[word][::-1], word)
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, 'rhyme_trie.bin')
+        FlatRhymeTrie.from_trie(cls.rt).save(cls.path)
+        cls.flat = load_rhyme_trie_snapshot(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_load(self):
+        self.assertIsInstance(self.flat, FlatRhymeTrieNode)
+        self.assertEqual(self.flat.count_nodes(), self.rt.count_nodes())
+        self.assertEqual(self.flat.count_words(), self.rt.count_words())
+        phones = word_phone_dict['DOG'][::-1]
+        for depth in range(len(phones)):
+            self.assertEqual(self.flat.search(phones[:depth]).child_mask,
+                             self.rt.search(phones[:depth]).child_mask)
+
+    def test_build(self):
+        flat = FlatRhymeTrie.build({word: word_phone_dict[word]
+                                    for word in self.words})
+        self.assertEqual(list(flat.node_parent), list(self.flat.trie.node_parent))
+        self.assertEqual(list(flat.edge_child), list(self.flat.trie.edge_child))
+        self.assertEqual(list(flat.node_end), list(self.flat.trie.node_end))
+        self.assertEqual(bytes(flat.word_blob), bytes(self.flat.trie.word_blob))
+        self.assertEqual(flat.root.search(word_phone_dict['DOG'][::-1]).words,
+                         {'dog'})
+
+    def test_search(self):
+        for word in ('DOG', 'LEVEN'):
+            phones = word_phone_dict[word][::-1]
+            self.assertEqual(self.flat.search(phones).words,
+                             self.rt.search(phones).words)
+            self.assertEqual(set(self.flat.search(phones[:2]).get_sub_words()),
+                             set(self.rt.search(phones[:2]).get_sub_words()))
+        self.assertIsNone(self.flat.search(['ZH', 'ZH', 'ZH']))
+        self.assertTrue(self.flat.contains(word_phone_dict['DOG'][::-1]))
+
+    def test_sub_word_ranges(self):
+        for word in ('DOG', 'LEVEN'):
+            phones = word_phone_dict[word][::-1]
+            for depth in range(len(phones) + 1):
+                flat = self.flat.search(phones[:depth])
+                node = self.rt.search(phones[:depth])
+                words = flat.get_sub_words()
+                self.assertEqual(sorted(words), sorted(node.get_sub_words()))
+                self.assertEqual(flat.count_sub_words(), len(words))
+                self.assertEqual(node.count_sub_words(), len(words))
+                self.assertEqual(flat.count_nodes(), node.count_nodes())
+        start, end = self.flat.trie.get_sub_word_range(0)
+        self.assertEqual((start, end), (0, len(set(self.words))))
+        self.assertEqual(self.flat.trie.get_word_slice(start, end),
+                         [self.flat.trie.get_word(i) for i in range(end)])
+
+    def test_syllable_ranges(self):
+        word_info = load_word_info()
+        stack = [(self.rt, ())]
+        while stack:
+            node, phones = stack.pop()
+            flat = self.flat.search(phones)
+            syllables = {word_info[word].syllables
+                         for word in node.get_sub_words()}
+            for trie_node in (node, flat):
+                self.assertEqual(
+                    (trie_node.min_syllables, trie_node.max_syllables),
+                    (min(syllables), max(syllables)))
+                for count in range(1, 5):
+                    self.assertEqual(
+                        sorted(trie_node.get_sub_words(count)),
+                        sorted(word for word in node.get_sub_words()
+                               if word_info[word].syllables == count))
+            stack.extend((child, phones + (phone,))
+                         for phone, child in node.children.items())
+        built = FlatRhymeTrie.build({word: word_phone_dict[word]
+                                     for word in self.words})
+        self.assertEqual(list(built.node_min_syllables),
+                         list(self.flat.trie.node_min_syllables))
+
+    def test_assemble(self):
+        phones = word_phone_dict['KLEVEN'][::-1]
+        self.assertEqual(list(self.flat.search(phones).assemble()),
+                         phones[::-1])
+
+    def test_search_permutations(self):
+        phones = [PermutedPhone('G', Permutations.FAMILY), 'AO1']
+        flat_nodes = self.flat.search_permutations(phones)
+        nodes = self.rt.search_permutations(phones)
+        self.assertEqual(
+            sorted(word for node in flat_nodes for word in node.get_sub_words()),
+            sorted(word for node in nodes for word in node.get_sub_words()))
+
+    def test_bad_snapshot(self):
+        path = os.path.join(self.tmp.name, 'bad.bin')
+        with open(self.path, 'rb') as f:
+            data = bytearray(f.read())
+        data[8:12] = (VERSION + 1).to_bytes(4, 'little')
+        with open(path, 'wb') as f:
+            f.write(data)
+        with self.assertRaises(ValueError):
+            FlatRhymeTrie.load(path)
+        with self.assertWarns(UserWarning):
+            self.assertIsNone(load_rhyme_trie_snapshot(path))
+        self.assertIsNone(load_rhyme_trie_snapshot(path + '.missing'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import sys
+sys.path.append('../')
+from Phyme.FuzzyRhymer import FuzzyRhymer, DEFAULT_COSTS
+from Phyme.RhymeTrieNode import RhymeTrieNode
+from Phyme.rhymeUtils import word_phone_dict, get_phone_mask
+
+
+class FuzzyRhymerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rhymer = FuzzyRhymer()
+
+    def test_get_tiers(self):
+        costs = DEFAULT_COSTS
+        tiers = dict((cost, mask) for cost, mask in self.rhymer.get_tiers('G'))
+        self.assertEqual(tiers[0], get_phone_mask(['G']))
+        self.assertEqual(tiers[costs.family], get_phone_mask(['B', 'D']))
+        self.assertEqual(tiers[costs.partner], get_phone_mask(['P', 'T', 'K']))
+        tiers = dict(self.rhymer.get_tiers('AO1'))
+        self.assertEqual(tiers[costs.stress], get_phone_mask(['AO0', 'AO2',
+                                                             'AO']))
+        rhymer = FuzzyRhymer(costs._replace(vowel=None))
+        self.assertEqual(len(rhymer.get_tiers('AO1')), 2)
+
+    def test_search(self):
+        rt = RhymeTrieNode.build(
+            (word_phone_dict[word][::-1], word.lower())
+            for word in ('DOG', 'LOG', 'DOGS', 'DOCK', 'DUCK', 'DOT', 'CAT'))
+        found = [(cost, set(node.get_sub_words())) for cost, node in
+                 self.rhymer.search(rt, ['AO1', 'G'], 2.0)]
+        self.assertEqual(found, [(0, {'dog', 'log'})])
+        # DOGS, DOCK and DOT are AA1 in the dictionary
+        found = [(cost, set(node.get_sub_words())) for cost, node in
+                 self.rhymer.search(rt, ['AA1', 'G'], 2.0)]
+        self.assertEqual(found[0], (DEFAULT_COSTS.insertion, {'dogs'}))
+        self.assertEqual(sorted(found[1:], key=lambda item: sorted(item[1])),
+                         [(DEFAULT_COSTS.partner, {'dock'}),
+                          (DEFAULT_COSTS.partner, {'dot'})])
+        found = list(self.rhymer.search(rt, ['AA1', 'G'], DEFAULT_COSTS.vowel))
+        self.assertEqual(found[-1], (DEFAULT_COSTS.vowel,
+                                     rt.search(['G', 'AO1'])))
+
+
+if __name__ == '__main__':
+    unittest.main()
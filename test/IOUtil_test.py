@@ -0,0 +1,99 @@
+import subprocess
+import tempfile
+import threading
+import unittest
+import os
+import sys
+sys.path.append('../')
+from array import array
+from Phyme import IOUtil
+from Phyme.util import load_once
+
+# importing Phyme must not load any dataset, so it should stay well under this
+IMPORT_TIME_TARGET = 0.25
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class IOUtilTest(unittest.TestCase):
+
+    def test_import_is_lazy(self):
+        script = ('import time\n'
+                  't = time.perf_counter()\n'
+                  'import Phyme\n'
+                  'print(time.perf_counter() - t)\n'
+                  'from Phyme import IOUtil, rhymeUtils\n'
+                  'print(any(loader.loaded for loader in (\n'
+                  '    IOUtil.load_word_phone_dict,\n'
+                  '    IOUtil.load_phone_type_dicts,\n'
+                  '    IOUtil.load_word_keys,\n'
+                  '    IOUtil.load_keyed_counts,\n'
+                  '    IOUtil.load_keyed_pairs,\n'
+                  '    rhymeUtils.get_vowels)))\n')
+        output = subprocess.check_output([sys.executable, '-c', script],
+                                         cwd=ROOT, universal_newlines=True)
+        import_time, loaded = output.split()
+        self.assertLess(float(import_time), IMPORT_TIME_TARGET)
+        self.assertEqual(loaded, 'False')
+
+    def test_load_once(self):
+        calls = []
+
+        @load_once
+        def loader():
+            calls.append(None)
+            return object()
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(loader()))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_loaders(self):
+        self.assertEqual(IOUtil.load_word_phone_dict()['DOG'],
+                         ['D', 'AO1', 'G'])
+        self.assertIs(IOUtil.load_keyed_counts(), IOUtil.load_keyed_counts())
+
+    def test_sections(self):
+        layout = (('ids', 'I'), ('blob', 'B'))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'test.bin')
+            IOUtil.write_sections(path, b'PHYMTEST', 1, layout,
+                                  {'ids': array('I', [1, 2, 3]),
+                                   'blob': b'abc'})
+            old, old_buffer = IOUtil.map_sections(path, b'PHYMTEST', 1,
+                                                  layout)
+            # a new file replaces the old one, which stays readable
+            IOUtil.write_sections(path, b'PHYMTEST', 1, layout,
+                                  {'ids': array('I', [4]), 'blob': b''})
+            self.assertEqual(list(old['ids']), [1, 2, 3])
+            self.assertEqual(bytes(old['blob']), b'abc')
+            self.assertEqual(os.listdir(tmp), ['test.bin'])
+            new, new_buffer = IOUtil.map_sections(path, b'PHYMTEST', 1,
+                                                  layout)
+            self.assertEqual(list(new['ids']), [4])
+            with open(path, 'rb') as f:
+                data = f.read()
+            with open(path, 'wb') as f:
+                f.write(data[:-1])
+            with self.assertRaises(ValueError):
+                IOUtil.map_sections(path, b'PHYMTEST', 1, layout)
+            # an ids section at an odd offset
+            header = IOUtil._HEADER.size
+            misaligned = bytearray(data)
+            misaligned[header:header + 8] = (header + 1).to_bytes(8, 'little')
+            with open(path, 'wb') as f:
+                f.write(misaligned)
+            with self.assertRaises(ValueError):
+                IOUtil.map_sections(path, b'PHYMTEST', 1, layout)
+            del old, new
+            old_buffer.close()
+            new_buffer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import sys
+sys.path.append('../')
+from Phyme.PhraseRhymer import PhraseRhymer
+from Phyme.RhymeTrieNode import RhymeTrieNode
+from Phyme.rhymeUtils import (word_phone_dict, merge_patterns, PermutedPhone,
+                              Permutations)
+
+
+class PhraseRhymerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rt = RhymeTrieNode.build(
+            (word_phone_dict[word][::-1], word.lower())
+            for word in ('DOOR', 'FOR', 'POUR', 'HINGE', 'SINGE', 'ORANGE'))
+        self.ranks = {'for': 0, 'door': 1, 'hinge': 2, 'pour': 3, 'singe': 4,
+                      'orange': 5}
+
+    def search(self, phones, max_words=2, limit=50, ranks=None):
+        ranks = self.ranks if ranks is None else ranks
+        rhymer = PhraseRhymer(self.rt, ranks.get)
+        return rhymer.search(merge_patterns([phones[::-1]]), max_words, limit)
+
+    def test_search(self):
+        phones = ['AO1', 'R', PermutedPhone('HH', Permutations.SUBSTITUTION),
+                  'IH1', 'N', 'JH']
+        self.assertEqual(self.search(phones),
+                         [((2, 2), ('for', 'hinge')),
+                          ((2, 3), ('door', 'hinge')),
+                          ((2, 4), ('for', 'singe')),
+                          ((2, 5), ('door', 'singe')),
+                          ((2, 5), ('pour', 'hinge')),
+                          ((2, 7), ('pour', 'singe'))])
+        self.assertEqual(len(self.search(phones, limit=2)), 2)
+        ranks = dict(self.ranks, singe=None)
+        self.assertEqual([words for _, words in self.search(phones,
+                                                            ranks=ranks)],
+                         [('for', 'hinge'), ('door', 'hinge'),
+                          ('pour', 'hinge')])
+
+    def test_max_words(self):
+        phones = word_phone_dict['DOOR'] * 3
+        self.assertEqual(self.search(phones), [])
+        self.assertEqual(self.search(phones, max_words=3),
+                         [((3, 3), ('door', 'door', 'door'))])
+
+
+if __name__ == '__main__':
+    unittest.main()
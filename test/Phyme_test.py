@@ -2,7 +2,10 @@ import unittest
 import sys
 sys.path.append('../')
 from Phyme import Phyme
+from Phyme import rhymeUtils as ru
 from Phyme.util import flatten
+from Phyme.QueryBudget import QueryBudget
+from Phyme.songStats import sort_words, get_count_rank
 
 
 class PhymeTest(unittest.TestCase):
@@ -44,6 +47,191 @@ class PhymeTest(unittest.TestCase):
     def test_sorted(self):
         self.assertEqual(self.rd.get_perfect_rhymes('say')[1][0], 'way')
 
+    def test_get_rhymes(self):
+        self.assertEqual(self.rd.get_rhymes('dog', 'partner'),
+                         self.rd.get_partner_rhymes('dog'))
+        with self.assertRaises(ValueError):
+            self.rd.get_rhymes('dog', 'bogus')
+
+    def test_batch_rhymes(self):
+        words = ['dog', 'log', 'fire', 'asdfghjkl', 'dog']
+        types = ['perfect', 'family', 'assonance']
+        # these words are all in the rhyme table: search them
+        rd = Phyme(use_table=False)
+        results = rd.batch_rhymes(words, types=types)
+        self.assertEqual(set(results), set(words))
+        self.assertIsNone(results['asdfghjkl'])
+        for word in ('dog', 'log', 'fire'):
+            for rhyme_type in types:
+                self.assertEqual(results[word][rhyme_type],
+                                 rd.get_rhymes(word, rhyme_type))
+        self.assertEqual(rd.batch_rhymes(words, types=types, processes=2),
+                         results)
+
+    def test_iter_rhymes(self):
+        for rhyme_type in ('perfect', 'consonant'):
+            rhymes = flatten(self.rd.get_rhymes('say', rhyme_type).values())
+            top = list(self.rd.iter_rhymes('say', rhyme_type, limit=10))
+            self.assertEqual(top, sort_words('say', rhymes)[:10])
+        self.assertEqual(set(self.rd.iter_rhymes('dog', 'perfect')),
+                         set(flatten(self.rd.get_perfect_rhymes('dog').values())))
+        self.assertEqual(list(self.rd.iter_rhymes('do', 'subtractive')), [])
+
+    def test_rhymes_with(self):
+        self.assertTrue(self.rd.rhymes_with('dog', 'cog', 'perfect'))
+        self.assertTrue(self.rd.rhymes_with('factor', 'faster', 'substitution'))
+        self.assertFalse(self.rd.rhymes_with('dog', 'fire', 'perfect'))
+        self.assertFalse(self.rd.rhymes_with('dog', 'asdfghjkl', 'perfect'))
+        for rhyme_type in ('family', 'additive', 'subtractive', 'assonance',
+                           'consonant'):
+            rhymes = set(flatten(self.rd.get_rhymes('dudes', rhyme_type)
+                                 .values()))
+            for other in ('dues', 'dude', 'do', 'cat', 'shoes', 'tubes'):
+                self.assertEqual(
+                    self.rd.rhymes_with('dudes', other, rhyme_type),
+                    other in rhymes, (rhyme_type, other))
+        with self.assertRaises(ValueError):
+            self.rd.rhymes_with('dog', 'cog', 'bogus')
+
+    def test_query_stats(self):
+        collected = []
+        # like cache hits, answers from the rhyme table are not measured
+        rd = Phyme(stats_hook=collected.append, use_table=False)
+        result = rd.get_family_rhymes('dog')
+        self.assertEqual(result, self.rd.get_family_rhymes('dog'))
+        stats, = collected
+        self.assertEqual((stats.word, stats.rhyme_type), ('dog', 'family'))
+        self.assertEqual(list(stats.timings), ['pattern', 'traversal',
+                                               'sub_words', 'grouping',
+                                               'sorting'])
+        self.assertGreater(stats.total, 0)
+        self.assertEqual(stats.counters['results'],
+                         len(list(flatten(result.values()))))
+        self.assertGreaterEqual(stats.counters['states'],
+                                stats.counters['nodes'])
+        self.assertGreaterEqual(stats.counters['matches'],
+                                stats.counters['roots'])
+        result, stats = self.rd.get_rhymes_with_stats('do', 'subtractive')
+        self.assertEqual(result, {})
+        self.assertNotIn('states', stats.counters)
+
+    def test_rhyme_index(self):
+        indexed = Phyme(use_table=False)
+        rd = Phyme(use_index=False, use_table=False)
+        for rhyme_type in ('assonance', 'consonant'):
+            for word in ('dog', 'orange'):
+                self.assertEqual(indexed.get_rhymes(word, rhyme_type),
+                                 rd.get_rhymes(word, rhyme_type))
+        result, stats = indexed.get_rhymes_with_stats('dog', 'assonance')
+        self.assertEqual(stats.counters['indexed'], 1)
+        self.assertNotIn('states', stats.counters)
+        self.assertEqual(list(indexed.iter_rhymes('dog', 'assonance', limit=5)),
+                         list(rd.iter_rhymes('dog', 'assonance', limit=5)))
+
+    def test_variant_rhymes(self):
+        rhymes = list(flatten(self.rd.get_variant_rhymes('read', 'perfect')
+                              .values()))
+        self.assertTrue({'red', 'reed', 'bed', 'need'} <= set(rhymes))
+        self.assertEqual(len(rhymes), len(set(rhymes)))
+        self.assertFalse(any('(' in word for word in rhymes))
+        self.assertEqual(self.rd.get_variant_rhymes('read(1)', 'perfect'),
+                         self.rd.get_variant_rhymes('read', 'perfect'))
+        self.assertEqual(
+            set(flatten(self.rd.get_variant_rhymes('dog', 'family').values())),
+            set(map(ru.strip_pronunciation_marker,
+                    flatten(self.rd.get_family_rhymes('dog').values()))))
+        with self.assertRaises(KeyError):
+            self.rd.get_variant_rhymes('asdfghjkl', 'perfect')
+
+    def test_budget(self):
+        full = self.rd.get_additive_rhymes('furuya', 3)
+        for rd in (self.rd, Phyme(engine='node'), Phyme(cache_size=10)):
+            budget = QueryBudget(max_nodes=100)
+            partial = rd.get_additive_rhymes('furuya', 3, budget)
+            self.assertEqual(budget.truncated, 'max_nodes')
+            self.assertLessEqual(set(flatten(partial.values())),
+                                 set(flatten(full.values())))
+        budget = QueryBudget(max_results=3)
+        rhymes = self.rd.get_rhymes('dog', 'assonance', budget=budget)
+        self.assertEqual(len(list(flatten(rhymes.values()))), 3)
+        self.assertEqual(budget.truncated, 'max_results')
+        budget = QueryBudget(timeout=0)
+        self.assertEqual(self.rd.get_substitution_rhymes('master', 2, budget),
+                         {})
+        self.assertEqual(budget.truncated, 'timeout')
+        budget = QueryBudget(max_nodes=10 ** 6, timeout=60)
+        self.assertEqual(self.rd.get_family_rhymes('dog', budget=budget),
+                         self.rd.get_family_rhymes('dog'))
+        self.assertIsNone(budget.truncated)
+        budget = QueryBudget()
+        budget.cancel()
+        self.assertEqual(self.rd.get_perfect_rhymes('dog', budget=budget), {})
+        self.assertEqual(budget.truncated, 'cancelled')
+
+    def test_fuzzy_rhymes(self):
+        rhymes = self.rd.get_fuzzy_rhymes('dog', limit=50)
+        self.assertEqual(len(rhymes), 50)
+        self.assertNotIn('dog', [word for word, _ in rhymes])
+        self.assertEqual(rhymes[0][1], 0)
+        costs = [cost for _, cost in rhymes]
+        self.assertEqual(costs, sorted(costs))
+        perfect = set(map(ru.strip_pronunciation_marker, flatten(
+            self.rd.get_perfect_rhymes('dog').values()))) - {'dog'}
+        exact = self.rd.get_fuzzy_rhymes('dog', limit=None, max_cost=0)
+        self.assertEqual({word for word, _ in exact}, perfect)
+        self.assertEqual(Phyme(engine='node').get_fuzzy_rhymes('dog'),
+                         self.rd.get_fuzzy_rhymes('dog'))
+
+    def test_word_filter(self):
+        rhymes = self.rd.get_assonance_rhymes('fire')
+        self.assertEqual(self.rd.get_assonance_rhymes('fire', syllables=2),
+                         {2: rhymes[2]})
+        self.assertEqual(self.rd.get_rhymes('dog', 'additive', syllables=4),
+                         dict())
+        stressed = self.rd.get_rhymes('fire', 'additive', stresses='10')
+        self.assertEqual(list(stressed), [2])
+        self.assertTrue(all(ru.get_word_info(word).stresses == '10'
+                            for word in stressed[2]))
+        rd = Phyme(engine='node', cache_size=8, use_index=False)
+        for _ in range(2):
+            filtered = rd.get_assonance_rhymes('fire', syllables=2)
+            self.assertEqual(list(filtered), [2])
+            self.assertEqual(list(filtered[2]), rhymes[2])
+        self.assertEqual(rd.cache_stats().hits, 1)
+
+    def test_phrase_rhymes(self):
+        phrases = self.rd.get_phrase_rhymes('today', num_syllables=2,
+                                            limit=20)
+        self.assertEqual(len(phrases), 20)
+        pattern = ru.get_rhyme_pattern('today', 'perfect', 2)
+        for phrase in phrases:
+            words = phrase.split(' ')
+            self.assertEqual(len(words), 2)
+            # words may rhyme in any of their pronunciations
+            self.assertTrue(any(
+                ru.matches_rhyme_pattern(pattern, ru.get_word_phones(first) +
+                                         ru.get_word_phones(second))
+                for first in ru.get_word_variants(words[0])
+                for second in ru.get_word_variants(words[1])))
+        self.assertEqual(Phyme(engine='node').get_phrase_rhymes(
+            'today', num_syllables=2, limit=20), phrases)
+        common = self.rd.get_phrase_rhymes('today', num_syllables=2,
+                                           max_rank=100)
+        for phrase in common:
+            for word in phrase.split(' '):
+                self.assertLessEqual(get_count_rank(word), 100)
+        with self.assertRaises(KeyError):
+            self.rd.get_phrase_rhymes('asdfghjkl')
+        with self.assertRaises(ValueError):
+            self.rd.get_phrase_rhymes('today', 'bogus')
+
+    def test_node_engine(self):
+        rd = Phyme(engine='node', use_table=False)
+        self.assertEqual(rd.get_family_rhymes('dog'),
+                         Phyme(use_table=False).get_family_rhymes('dog'))
+        with self.assertRaises(ValueError):
+            Phyme(engine='bogus')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+import sys
+sys.path.append('../')
+from Phyme import Phyme
+from Phyme.RhymeCache import RhymeCache, CacheStats
+
+
+class RhymeCacheTest(unittest.TestCase):
+
+    def test_lru(self):
+        cache = RhymeCache(2)
+        cache.put('a', {1: ['x']})
+        cache.put('b', {1: ['y']})
+        self.assertEqual(cache.get('a'), {1: ('x',)})
+        cache.put('c', {1: ['z']})
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), {1: ('z',)})
+        self.assertEqual(cache.stats(), CacheStats(2, 1, 1, 2, 2))
+        with self.assertRaises(ValueError):
+            RhymeCache(0)
+
+    def test_frozen(self):
+        cache = RhymeCache(1)
+        value = cache.put('a', {1: ['x']})
+        with self.assertRaises(TypeError):
+            value[2] = ['y']
+        with self.assertRaises(AttributeError):
+            value[1].append('y')
+
+    def test_phyme_cache(self):
+        rd = Phyme(cache_size=2)
+        self.assertEqual(rd.cache_stats(), CacheStats(0, 0, 0, 0, 2))
+        rhymes = rd.get_perfect_rhymes('dog')
+        self.assertIs(rd.get_perfect_rhymes('dog'), rhymes)
+        self.assertIsNot(rd.get_perfect_rhymes('dog', 2), rhymes)
+        self.assertIsNot(rd.get_family_rhymes('dog'), rhymes)
+        self.assertEqual(rd.cache_stats(), CacheStats(1, 3, 1, 2, 2))
+        self.assertIn('cog', rhymes[1])
+        self.assertIsNone(Phyme().cache_stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
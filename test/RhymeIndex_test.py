@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+import sys
+sys.path.append('../')
+from Phyme.RhymeIndex import RhymeIndex, get_pattern_key
+from Phyme.FlatRhymeTrie import FlatRhymeTrie
+from Phyme.rhymeUtils import word_phone_dict, get_rhyme_pattern
+
+
+class RhymeIndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        words = sorted(word_phone_dict)[::20] + ['DOG', 'COG', 'BAG', 'JAUNT',
+                                                 'NIGHT', 'ORANGE']
+        cls.word_phone_dict = {word: word_phone_dict[word] for word in words}
+        cls.index = RhymeIndex.build(cls.word_phone_dict)
+        cls.trie = FlatRhymeTrie.build(cls.word_phone_dict).root
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, 'rhyme_index.bin')
+        cls.index.save(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def trie_search(self, pattern):
+        return [word for node in self.trie.search_permutation_roots(
+            pattern[::-1]) for word in node.get_sub_words()]
+
+    def test_search(self):
+        for word in ('dog', 'jaunt', 'night', 'orange'):
+            for rhyme_type in ('assonance', 'consonant'):
+                for num_syllables in (None, 1, 2):
+                    pattern = get_rhyme_pattern(word, rhyme_type,
+                                                num_syllables)
+                    self.assertEqual(self.index.search(pattern),
+                                     self.trie_search(pattern))
+        self.assertIn('cog', self.index.search(
+            get_rhyme_pattern('jaunt', 'assonance')))
+        self.assertIn('bag', self.index.search(
+            get_rhyme_pattern('dog', 'consonant')))
+
+    def test_pattern_key(self):
+        self.assertEqual(get_pattern_key(get_rhyme_pattern(
+            'dog', 'assonance'))[0], 'assonance')
+        self.assertEqual(get_pattern_key(get_rhyme_pattern(
+            'dog', 'consonant'))[0], 'consonant')
+        for rhyme_type in ('perfect', 'family', 'substitution'):
+            self.assertIsNone(self.index.search(get_rhyme_pattern(
+                'dog', rhyme_type)))
+
+    def test_load(self):
+        loaded = RhymeIndex.load(self.path)
+        self.assertEqual(loaded.words, self.index.words)
+        pattern = get_rhyme_pattern('orange', 'assonance')
+        self.assertEqual(loaded.search(pattern), self.index.search(pattern))
+        self.assertEqual(loaded.get_key('consonant', 0),
+                         self.index.get_key('consonant', 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
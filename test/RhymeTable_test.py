@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+import sys
+sys.path.append('../')
+from Phyme import Phyme
+from Phyme.Phyme import build_rhyme_table
+from Phyme.RhymeTable import RhymeTable, VERSION
+from Phyme.rhymeUtils import RHYME_TYPES
+
+
+class RhymeTableTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.words = ['love', 'dog', 'fire', 'desire', 'asdfghjkl']
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, 'rhyme_table.bin')
+        build_rhyme_table(cls.words).save(cls.path)
+        cls.table = RhymeTable.load(cls.path)
+        cls.live = Phyme(use_table=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_load(self):
+        self.assertEqual(len(self.table), 4)
+        self.assertEqual(self.table.queries, ['desire', 'dog', 'fire', 'love'])
+        self.assertEqual(self.table.rhyme_types, RHYME_TYPES)
+        self.assertNotIn('asdfghjkl', self.table)
+        self.assertIsNone(self.table.get_groups('night', 'perfect'))
+        groups = self.table.get_groups('fire', 'perfect')
+        self.assertEqual([syllables for syllables, _ in groups],
+                         list(self.live.get_perfect_rhymes('fire')))
+
+    def test_phyme(self):
+        rd = Phyme()
+        rd.rhyme_table = self.table
+        for word in self.words[:-1]:
+            for rhyme_type in RHYME_TYPES:
+                self.assertEqual(rd.get_rhymes(word, rhyme_type),
+                                 self.live.get_rhymes(word, rhyme_type))
+        self.assertEqual(rd.get_rhymes('love', 'assonance', syllables=2),
+                         self.live.get_rhymes('love', 'assonance',
+                                              syllables=2))
+        self.assertEqual(rd.get_assonance_rhymes('love', stresses='10'),
+                         self.live.get_assonance_rhymes('love',
+                                                        stresses='10'))
+        self.assertEqual(rd.batch_rhymes(['dog', 'night']),
+                         self.live.batch_rhymes(['dog', 'night']))
+        with self.assertRaises(KeyError):
+            rd.get_perfect_rhymes('asdfghjkl')
+
+    def test_workers(self):
+        table = build_rhyme_table(self.words, processes=2, chunk_size=4)
+        self.assertEqual(list(table.sections['result_ids']),
+                         list(self.table.sections['result_ids']))
+
+    def test_bad_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'rhyme_table.bin')
+            with open(self.path, 'rb') as f:
+                data = bytearray(f.read())
+            data[8:12] = (VERSION + 1).to_bytes(4, 'little')
+            with open(path, 'wb') as f:
+                f.write(data)
+            with self.assertRaises(ValueError):
+                RhymeTable.load(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
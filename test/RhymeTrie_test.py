@@ -3,7 +3,9 @@ import sys
 sys.path.append('../')
 from Phyme.RhymeTrieNode import RhymeTrieNode
 from Phyme.Phyme import load_rhyme_trie
-from Phyme.rhymeUtils import word_phone_dict
+from Phyme.rhymeUtils import (word_phone_dict, PermutedPhone, Permutations,
+                              get_phone_mask, get_phone_class_mask,
+                              merge_patterns, filter_words, WordFilter)
 
 
 class RhymeTrieTest(unittest.TestCase):
@@ -20,6 +22,110 @@ class RhymeTrieTest(unittest.TestCase):
 
     def test_contains(self):
         self.assertTrue(self.rt.contains(word_phone_dict['DOG'][::-1]))
+        self.assertFalse(self.rt.contains(word_phone_dict['DOG'][:0:-1]))
+
+    def test_build(self):
+        entries = [(word_phone_dict[word][::-1], word)
+                   for word in ('DOG', 'FROG', 'COG', 'DO', 'DOGS')]
+        built = RhymeTrieNode.build(sorted(entries))
+        inserted = RhymeTrieNode(None, None)
+        for phones, word in entries:
+            inserted.insert(phones, word)
+        self.assertEqual(built.count_nodes(), inserted.count_nodes())
+        self.assertEqual(set(built.get_sub_words()),
+                         set(inserted.get_sub_words()))
+        self.assertEqual(list(built.search(entries[0][0]).assemble()),
+                         word_phone_dict['DOG'])
+
+    def test_search_permutations(self):
+        phones = [PermutedPhone('G', Permutations.ADDITIVE),
+                  PermutedPhone('AO1', Permutations.ADDITIVE)]
+        words = set(word for node in self.rt.search_permutations(phones)
+                    for word in node.get_sub_words())
+        self.assertTrue({'dog', 'logs', 'morgue'} <= words)
+
+    def test_get_masked_children(self):
+        rt = RhymeTrieNode.build(
+            (word_phone_dict[word][::-1], word.lower())
+            for word in ('DOG', 'DOGS', 'DOT', 'DOVE'))
+        self.assertEqual(rt.child_mask, get_phone_mask(['G', 'T', 'Z', 'V']))
+        mask = get_phone_class_mask(
+            PermutedPhone('D', Permutations.SUBSTITUTION))
+        self.assertEqual(set(rt.get_masked_children(mask)),
+                         set(rt.children.values()))
+        for trie in (rt, self.rt):
+            self.assertEqual(
+                set(trie.get_masked_children(get_phone_mask(['G', 'T']))),
+                {trie.get_child('G'), trie.get_child('T')})
+
+    def test_search_permutation_roots(self):
+        rt = RhymeTrieNode.build(
+            (word_phone_dict[word][::-1], word.lower())
+            for word in ('DOG', 'COG', 'FOG', 'LOGS'))
+        phones = ['G', PermutedPhone('AO1', Permutations.ADDITIVE),
+                  PermutedPhone('D', Permutations.SUBTRACTIVE)]
+        nodes = list(rt.search_permutations(phones))
+        self.assertEqual(len(nodes), len(set(nodes)))
+        roots = rt.search_permutation_roots(phones)
+        self.assertEqual(roots, [rt.search(['G', 'AO1'])])
+        for trie in (self.rt, load_rhyme_trie('node')):
+            roots = trie.search_permutation_roots(phones)
+            words = [word for node in roots for word in node.get_sub_words()]
+            self.assertEqual(len(words), len(set(words)))
+            self.assertEqual(set(words), set(
+                word for node in trie.search_permutations(phones)
+                for word in node.get_sub_words()))
+
+    def test_search_pattern_roots(self):
+        patterns = [['G', PermutedPhone('AO1', Permutations.FAMILY)],
+                    ['T', PermutedPhone('AO1', Permutations.FAMILY)],
+                    ['G', 'AO1', 'D']]
+        pattern_trie = merge_patterns(patterns)
+        for trie in (self.rt, load_rhyme_trie('node')):
+            words = [word for node in trie.search_pattern_roots(pattern_trie)
+                     for word in node.get_sub_words()]
+            self.assertEqual(len(words), len(set(words)))
+            self.assertEqual(set(words), set(
+                word for phones in patterns
+                for node in trie.search_permutations(phones)
+                for word in node.get_sub_words()))
+
+    def test_syllables(self):
+        phones = [PermutedPhone('G', Permutations.ADDITIVE),
+                  PermutedPhone('AO1', Permutations.ADDITIVE)]
+        for trie in (self.rt, load_rhyme_trie('node')):
+            self.assertEqual(trie.min_syllables, 1)
+            words = [word for node in trie.search_permutation_roots(phones)
+                     for word in node.get_sub_words()]
+            for syllables in (1, 2, 3):
+                roots = trie.search_permutation_roots(phones,
+                                                      syllables=syllables)
+                self.assertTrue(all(node.has_syllables(syllables)
+                                    for node in roots))
+                self.assertEqual(
+                    sorted(word for node in roots
+                           for word in node.get_sub_words(syllables)),
+                    sorted(filter_words(words, WordFilter(syllables, None))))
+
+    def test_walk_patterns(self):
+        pattern_trie = merge_patterns([['JH', 'N', 'IH1', 'HH', 'R', 'AO1']])
+        for trie in (self.rt, load_rhyme_trie('node')):
+            states = list(trie.walk_patterns(pattern_trie))
+            self.assertEqual(len(states), len(set(states)))
+            hinge = trie.search(['JH', 'N', 'IH1', 'HH'])
+            self.assertIn('hinge', hinge.words)
+            self.assertIn((hinge, 4), states)
+            self.assertEqual(
+                [node for node, position in states
+                 if pattern_trie.accepting[position]],
+                list(trie.search_patterns(pattern_trie)))
+            # going on from the root after 'hinge'
+            self.assertEqual(set(trie.walk_patterns(pattern_trie, 4)),
+                             {(trie, 4), (trie.get_child('R'), 5),
+                              (trie.search(['R', 'AO1']), 6)})
+
+    def test_slots(self):
+        self.assertFalse(hasattr(RhymeTrieNode(None, None), '__dict__'))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+import sys
+sys.path.append('../')
+from Phyme.SongRanking import SongRanking, NO_RANK, VERSION
+from Phyme.songStats import load_song_ranking_file
+
+
+class SongRankingTest(unittest.TestCase):
+
+    def setUp(self):
+        word_keys = {'say': 'a', 'way': 'b', 'day': 'c', "ma'am": 'd',
+                     'hay': 'e'}
+        keyed_counts = {'a': 10, 'b': 9, 'c': 2}
+        keyed_pairs = {'a': ['e', 'b']}
+        self.ranking = SongRanking.build(word_keys, keyed_counts, keyed_pairs)
+
+    def test_build(self):
+        self.assertEqual(self.ranking.words, ['day', 'hay', "ma'am", 'say',
+                                              'way'])
+        self.assertEqual(list(self.ranking.count_ranks),
+                         [2, NO_RANK, NO_RANK, 10, 9])
+        self.assertEqual(self.ranking.get_count_rank('say'), 10)
+        self.assertIsNone(self.ranking.get_count_rank('hay'))
+        self.assertEqual(self.ranking.get_pair_ranks('say'), {4: 0, 1: 1})
+        self.assertEqual(self.ranking.get_pair_ranks('nay'), {})
+
+    def test_sort(self):
+        words = ['zay', "ma'am", 'say', 'hay', 'day', 'way']
+        self.assertEqual(self.ranking.sort(words, {}),
+                         ['day', 'way', 'say', 'hay', "ma'am", 'zay'])
+        self.assertEqual(
+            self.ranking.sort(words, self.ranking.get_pair_ranks('say')),
+            ['way', 'hay', 'day', 'say', "ma'am", 'zay'])
+
+    def test_resort(self):
+        words = ['zay', "ma'am", 'say', 'hay', 'day', 'way']
+        presorted = self.ranking.sort(words, {})
+        for word in ('say', 'day', 'nay'):
+            pair_ranks = self.ranking.get_pair_ranks(word)
+            self.assertEqual(self.ranking.resort(presorted, pair_ranks),
+                             self.ranking.sort(words, pair_ranks))
+        self.assertEqual(self.ranking.resort(['hay', 'zay'], {1: 0}),
+                         ['hay', 'zay'])
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'song_ranking.bin')
+            self.ranking.save(path)
+            loaded = load_song_ranking_file(path)
+            self.assertEqual(loaded.words, self.ranking.words)
+            self.assertEqual(list(loaded.count_ranks),
+                             list(self.ranking.count_ranks))
+            self.assertEqual(loaded.get_pair_ranks('say'), {4: 0, 1: 1})
+            self.assertEqual(loaded.sort(['hay', 'say', 'day'], {}),
+                             ['day', 'say', 'hay'])
+            del loaded
+            with open(path, 'r+b') as f:
+                f.seek(8)
+                f.write((VERSION + 1).to_bytes(4, 'little'))
+            with self.assertWarns(UserWarning):
+                self.assertIsNone(load_song_ranking_file(path))
+            self.assertIsNone(load_song_ranking_file(path + '.missing'))
+
+
+if __name__ == '__main__':
+    unittest.main()
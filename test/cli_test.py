@@ -0,0 +1,71 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+import sys
+sys.path.append('../')
+from Phyme import Phyme
+from Phyme.cli import main, iter_chunks
+
+
+class CliTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, 'words.txt')
+        cls.words = ['dog', 'fire', 'asdfghjkl', 'night', 'dog', 'orange']
+        with open(cls.path, 'w') as f:
+            f.write('\n'.join(cls.words[:3]) + '\n\n' +
+                    '\n'.join(cls.words[3:]) + '\n')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def run_main(self, *args):
+        stdout = io.StringIO()
+        self.assertEqual(main(list(args) + [self.path], stdout), 0)
+        return [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+    def test_ordered(self):
+        lines = self.run_main('--types', 'perfect,family', '--chunk-size', '2')
+        self.assertEqual([line['word'] for line in lines], self.words)
+        self.assertEqual(lines[2], {'word': 'asdfghjkl',
+                                    'error': 'not in dictionary'})
+        self.assertEqual(set(lines[0]['rhymes']), {'perfect', 'family'})
+        self.assertEqual(lines[0]['rhymes']['family'],
+                         {str(k): v for k, v in
+                          Phyme().get_family_rhymes('dog').items()})
+
+    def test_workers_unordered(self):
+        ordered = self.run_main('-t', 'assonance', '-n', '2')
+        lines = self.run_main('-t', 'assonance', '-n', '2', '--workers', '2',
+                              '--unordered', '--chunk-size', '1')
+        key = lambda line: json.dumps(line, sort_keys=True)
+        self.assertEqual(sorted(lines, key=key), sorted(ordered, key=key))
+
+    def test_syllables(self):
+        lines = self.run_main('-t', 'perfect,assonance', '--num-syllables',
+                              '2', '--syllables', '3')
+        rd = Phyme()
+        self.assertEqual(lines[1]['rhymes']['assonance'],
+                         {str(k): v for k, v in rd.get_assonance_rhymes(
+                             'fire', 2, syllables=3).items()})
+        self.assertIsNone(lines[2].get('rhymes'))
+        stressed = self.run_main('-t', 'additive', '--stresses', '10')
+        self.assertEqual(stressed[1]['rhymes']['additive'],
+                         {str(k): v for k, v in rd.get_additive_rhymes(
+                             'fire', stresses='10').items()})
+        with self.assertWarns(FutureWarning):
+            self.assertEqual(self.run_main('-t', 'assonance', '-s', '2'),
+                             self.run_main('-t', 'assonance', '-n', '2'))
+
+    def test_iter_chunks(self):
+        self.assertEqual(list(iter_chunks(['a\n', '\n', ' b ', 'c'], 2)),
+                         [['a', 'b'], ['c']])
+
+
+if __name__ == '__main__':
+    unittest.main()
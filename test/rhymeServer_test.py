@@ -0,0 +1,121 @@
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+import sys
+sys.path.append('../')
+from Phyme import Phyme
+from Phyme.rhymeServer import make_server, RhymeClient, RequestError
+
+
+class RhymeServerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.phyme = Phyme()
+        cls.server = make_server(cls.phyme, port=0)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.start()
+        cls.client = RhymeClient(port=cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.thread.join()
+
+    def test_rhymes(self):
+        rhymes = self.client.get_rhymes('dog', 'family')
+        self.assertEqual(rhymes, {str(k): v for k, v in
+                                  self.phyme.get_family_rhymes('dog').items()})
+        self.assertEqual(self.client.get_rhymes('master', 'perfect', 2),
+                         {str(k): v for k, v in
+                          self.phyme.get_perfect_rhymes('master', 2).items()})
+
+    def test_errors(self):
+        with self.assertRaises(RequestError) as e:
+            self.client.get_rhymes('asdfghjkl')
+        self.assertEqual(e.exception.status, 404)
+        with self.assertRaises(RequestError) as e:
+            self.client.get_rhymes('dog', 'bogus')
+        self.assertEqual(e.exception.status, 400)
+        with self.assertRaises(RequestError) as e:
+            self.client._request('GET', '/nowhere')
+        self.assertEqual(e.exception.status, 404)
+        for body in ({'words': ['dog', 1]}, {'words': 'dog'},
+                     {'words': ['dog'], 'types': 'perfect'},
+                     {'words': ['dog'], 'types': [['perfect']]}):
+            with self.assertRaises(RequestError) as e:
+                self.client._request('POST', '/batch', body)
+            self.assertEqual(e.exception.status, 400)
+
+    def test_batch(self):
+        results = self.client.batch_rhymes(['dog', 'asdfghjkl'],
+                                           ['perfect', 'assonance'])
+        self.assertIsNone(results['asdfghjkl'])
+        self.assertEqual(results['dog']['perfect'], self.client.get_rhymes(
+            'dog', 'perfect'))
+
+    def test_health_metrics(self):
+        self.assertEqual(self.client.health()['status'], 'ok')
+        before = self.client.metrics()['requests']
+        self.client.health()
+        metrics = self.client.metrics()
+        self.assertEqual(metrics['requests'], before + 2)
+        self.assertEqual(len(metrics['workers']), 1)
+
+    def test_limits(self):
+        server = make_server(self.phyme, port=0, limits={'max_results': 2})
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            client = RhymeClient(port=server.server_port)
+            result = client._request('GET', '/rhymes?word=dog&type=assonance')
+            self.assertEqual(result['truncated'], 'max_results')
+            self.assertEqual(sum(map(len, result['rhymes'].values())), 2)
+            results = client.batch_rhymes(['dog', 'asdfghjkl'],
+                                          ['assonance'])
+            self.assertIsNone(results['asdfghjkl'])
+            self.assertEqual(
+                sum(map(len, results['dog']['assonance'].values())), 2)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        result = self.client._request('GET', '/rhymes?word=dog')
+        self.assertIsNone(result['truncated'])
+
+    def test_prefork_unix_socket(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'phyme.sock')
+            env = dict(os.environ, PYTHONPATH=os.path.dirname(
+                os.path.dirname(os.path.abspath(__file__))))
+            process = subprocess.Popen(
+                [sys.executable, '-m', 'Phyme.rhymeServer', '--workers', '2',
+                 '--unix-socket', path], env=env)
+            try:
+                client = RhymeClient(unix_socket=path)
+                deadline = time.time() + 60
+                while True:
+                    try:
+                        client.health()
+                        break
+                    except OSError:
+                        if time.time() > deadline:
+                            raise
+                        time.sleep(0.1)
+                self.assertEqual(client.get_rhymes('dog', 'family'),
+                                 self.client.get_rhymes('dog', 'family'))
+                pids = {worker['pid'] for worker in
+                        client.metrics()['workers']}
+                self.assertEqual(len(pids), 2)
+                self.assertNotIn(process.pid, pids)
+            finally:
+                process.terminate()
+                self.assertEqual(process.wait(30), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -56,6 +56,86 @@ class RhymeUtilsTest(unittest.TestCase):
     def get_consonant_partners(self):
         self.assertTrue('CH' in ru.get_consonant_partners('JH'))
 
+    def test_word_info(self):
+        info = ru.get_word_info('begin')
+        self.assertEqual(info, ru.WordInfo(2, '01', 3))
+        self.assertEqual(ru.get_word_info('BEGIN'), info)
+        self.assertEqual(ru.count_syllables('antidisestablishmentarianism'), 12)
+        self.assertEqual(ru.make_word_info(['HH', 'M']).last_stressed, None)
+
+    def test_word_filter(self):
+        self.assertIsNone(ru.make_word_filter())
+        self.assertEqual(ru.make_word_filter(2), ru.WordFilter(2, None))
+        self.assertEqual(ru.make_word_filter(stresses='01'),
+                         ru.WordFilter(2, '01'))
+        with self.assertRaises(ValueError):
+            ru.make_word_filter(3, '01')
+        words = ['begin', 'dog', 'fire', 'ago']
+        self.assertEqual(ru.filter_words(words, ru.make_word_filter(2)),
+                         ['begin', 'fire', 'ago'])
+        self.assertEqual(ru.filter_words(words, ru.make_word_filter(
+            stresses='01')), ['begin', 'ago'])
+
+    def test_group_word_info(self):
+        word_info = {'dog': ru.make_word_info(ru.get_phones('dog')),
+                     'cog': ru.make_word_info(ru.get_phones('cog'))}
+        self.assertEqual(ru.group_word_info(word_info),
+                         [[1, '1', 1, ['cog', 'dog']]])
+
+    def test_get_last_syllables(self):
+        self.assertEqual(ru.get_last_syllables('master'),
+                         [['AE1', 'S', 'T'], ['ER0']])
+        self.assertEqual(ru.get_last_syllables('dog', 3), [['AO1', 'G']])
+
+    def test_get_rhyme_pattern(self):
+        self.assertEqual(ru.get_rhyme_pattern('dog', 'perfect'), ('AO1', 'G'))
+        self.assertEqual(ru.get_rhyme_pattern('dog', 'family'),
+                         ('AO1', ru.PermutedPhone('G', ru.Permutations.FAMILY)))
+        self.assertEqual(ru.get_rhyme_pattern('log', 'assonance'),
+                         (ru.PermutedPhone('AO1', ru.Permutations.ADDITIVE),))
+        self.assertIsNone(ru.get_rhyme_pattern('do', 'subtractive'))
+        with self.assertRaises(ValueError):
+            ru.get_rhyme_pattern('dog', 'bogus')
+
+    def test_phone_class_mask(self):
+        phones_by_id = ru.get_phones_by_id()
+        family = ru.PermutedPhone('Z', ru.Permutations.FAMILY)
+        mask = ru.get_phone_class_mask(family)
+        self.assertEqual({phones_by_id[i] for i in ru.iter_mask_ids(mask)},
+                         set(ru.get_consonant_family('Z')))
+        self.assertEqual(ru.get_phone_class_mask('G'),
+                         ru.get_phone_mask(['G']))
+        self.assertEqual(ru.get_phone_class_mask('bogus'), 0)
+        self.assertEqual(list(ru.iter_mask_ids(0b100101)), [0, 2, 5])
+        for count_bits in (ru.count_bits, ru._count_bits):
+            self.assertEqual(count_bits(0b100101), 3)
+            self.assertEqual(count_bits(1 << 100), 1)
+
+    def test_word_variants(self):
+        self.assertEqual(ru.strip_pronunciation_marker('read(1)'), 'read')
+        self.assertEqual(ru.get_word_variants('read'), ['read', 'read(1)'])
+        self.assertEqual(ru.get_word_variants('READ(1)'), ['read', 'read(1)'])
+        self.assertEqual(ru.get_word_variants('dog'), ['dog'])
+        self.assertEqual(ru.make_word_variants(['a', 'a(2)', 'a(1)', 'b']),
+                         {'a': ['a', 'a(1)', 'a(2)']})
+        with self.assertRaises(KeyError):
+            ru.get_word_variants('asdfghjkl')
+
+    def test_merge_patterns(self):
+        additive = ru.PermutedPhone('G', ru.Permutations.ADDITIVE)
+        steps, accepting = ru.merge_patterns([['G', 'AO1'], ['G', 'AA1'],
+                                              ['G', 'AO1', 'D'], ['G']])
+        # ['G'] matches everything the longer patterns do
+        self.assertEqual(steps[0], ((ru.get_phone_mask(['G']), None, 1),))
+        self.assertTrue(accepting[1])
+        self.assertEqual(steps[1], ())
+        steps, accepting = ru.merge_patterns([['G', 'AO1'], ['G', 'AA1']])
+        self.assertEqual(len(steps[0]), 1)
+        self.assertEqual(len(steps[1]), 2)
+        self.assertEqual(accepting, [False, False, True, True])
+        with self.assertRaises(ValueError):
+            ru.merge_patterns([[additive], ['T']])
+
     def test_strip_leading_consonants(self):
         phones = ru.get_phones('frog')
         stripped = ru.strip_leading_consonants(phones)
@@ -21,8 +21,31 @@ class SongStatsTest(unittest.TestCase):
         self.assertIsNone(ss.get_count_rank('asdjfklajdsa'))
 
     def test_get_pairs_missing(self):
-        self.assertGreater(ss._sort_key('aslfjalsdf', {'say': 0}), '9999')
+        self.assertEqual(ss.get_paired_words('aslfjalsdf'), {})
+        self.assertEqual(ss.sort_words('aslfjalsdf', ['aslfjalsdf', 'say']),
+                         ['say', 'aslfjalsdf'])
+
+    def test_numeric_ranks(self):
+        ranking = ss.load_song_ranking()
+        ninth, tenth = (ranking.words[word_id] for _, word_id, _ in
+                        ss.load_count_ranked_words()[9:11])
+        self.assertEqual(ss.sort_words('asdjfklajdsa', [tenth, ninth]),
+                         [ninth, tenth])
+        self.assertEqual(ss.sort_words('asdjfklajdsa', [',comma', tenth]),
+                         [tenth, ',comma'])
+        ranked = list(ss.iter_ranked_words('asdjfklajdsa'))
+        self.assertEqual(ranked.index(tenth), ranked.index(ninth) + 1)
+        self.assertNotIn(',comma', ranked)
+        self.assertEqual(ss.sort_words('asdjfklajdsa', ["zz'z", 'zzy', ninth]),
+                         [ninth, 'zzy', "zz'z"])
     
+    def test_iter_ranked_words(self):
+        words = list(ss.iter_ranked_words('say'))
+        self.assertEqual(words[1], 'way')
+        self.assertEqual(ss.sort_words('say', words), words)
+        self.assertTrue(ss.is_ranked('way', ss.get_paired_words('say')))
+        self.assertFalse(ss.is_ranked('aslfjalsdf', {}))
+
     def test_strip(self):
         self.assertEqual(ss.strip_pronunciation_marker('cat(1)'), 'cat')
 